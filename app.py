@@ -1,24 +1,111 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, send_from_directory, stream_with_context
+from tempfile import SpooledTemporaryFile
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-import subprocess
-import pathlib
+import threading
 
-app = Flask(__name__)
+from gemini_v2 import RecommendationEngine, RecommendationError
+from catalog_registry import CatalogRegistry, CatalogError
+from jobs import JobQueue, QueueFullError, DONE, FAILED, CANCELLED, JOB_ID_RE
+from response_cache import ResponseCache
+from pdf_text import is_pdf, HEADER_BYTES
+from metrics import REGISTRY, Trace, span
+from static_assets import StaticAssets
+
+class UploadRequest(Request):
+    """Keeps uploads up to UPLOAD_MEMORY_BYTES in memory and spools larger ones to a temp file
+    while they are received (werkzeug's own threshold is 500 KB)."""
 
-# Save in current directory
-app.config['UPLOAD_FOLDER'] = "."
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=app.config['UPLOAD_MEMORY_BYTES'], mode="rb+")
+
+app = Flask(__name__)
+app.request_class = UploadRequest
+app.config.from_object(os.getenv("APP_CONFIG", "config.Config"))
+if app.config['METRICS_DIR']:
+    REGISTRY.share(app.config['METRICS_DIR'])
 
-# Fixed filename
+# Fixed filenames inside each job directory
 RESUME_FILENAME = "Resume.pdf"
 GEMINI_OUTPUT_MD = "resume_recommendation.md"
 
+# The engine holds the Gemini client and parsed catalog; built once and shared by all requests
+_engine = None
+_engine_lock = threading.Lock()
+
+response_cache = ResponseCache(
+    app.config['RESPONSE_CACHE_PATH'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+    max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+)
+
+def get_engine(reload=True):
+    """The shared engine, built on first use. The catalogs' background reload is started in
+    the calling process unless reload=False: the preloaded gunicorn master (wsgi.py) only
+    loads the catalogs, and each worker starts its own reload thread in post_fork."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                catalogs = CatalogRegistry(
+                    [app.config['DEFAULT_CATALOG']],
+                    directory=app.config['CATALOG_DIR'],
+                    interval=app.config['CATALOG_RELOAD_SECONDS'],
+                )
+                _engine = RecommendationEngine(cache=response_cache, single_call=app.config['SINGLE_CALL'],
+                                               catalogs=catalogs, prefetch_workers=app.config['PREFETCH_WORKERS'])
+    if reload:
+        _engine.catalogs.start()
+    return _engine
+
+def run_job(job):
+    """Run the recommendation pipeline for one job inside its own directory, publishing progress events."""
+    result = None
+    # small uploads had their first stages started by /upload (see RecommendationEngine.prefetch)
+    # or, if they had to queue, are held as bytes
+    prefetch = job.params.pop('prefetch', None)
+    resume = job.params.pop('resume', None) or job.workdir / RESUME_FILENAME
+    trace = job.params.pop('trace', None) or Trace()
+    try:
+        with trace.activate():
+            for event, data in get_engine().stream_recommend(
+                resume,
+                job.workdir / GEMINI_OUTPUT_MD,
+                catalog=job.params.get('catalog'),
+                prefetch=prefetch,
+                cancelled=lambda: job.cancelled,
+            ):
+                if event == 'result':
+                    result = data
+                job.publish(event, data)
+    finally:
+        job.trace = trace.to_dict()
+    return result
+
+def format_sse(event_id, event, data):
+    lines = ''.join(f"data: {ln}\n" for ln in str(data).split('\n'))
+    return f"id: {event_id}\nevent: {event}\n{lines}\n"
+
+job_queue = JobQueue(
+    run_job,
+    storage_root=app.config['UPLOAD_FOLDER'],
+    max_workers=app.config['MAX_CONCURRENT_JOBS'],
+    max_pending=app.config['MAX_PENDING_JOBS'],
+)
+
+static_assets = StaticAssets(
+    app.config['STATIC_ROOT'],
+    app.config['STATIC_EXTENSIONS'],
+    max_age=app.config['STATIC_MAX_AGE'],
+)
+
 @app.route('/')
 def serve_main():
-    return send_from_directory('.', 'main.html')
+    return static_assets.response('main.html')
 
 @app.route('/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('.', filename)
+    return static_assets.response(filename)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -29,40 +116,148 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    # Always save as resume.pdf
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], RESUME_FILENAME)
-    file.save(filepath)
-
-    # Run gemini_v2.py after saving
-    subprocess.run(['python', 'gemini_v2.py'], capture_output=True, text=True)
-
-    return jsonify({'success': True, 'filename': RESUME_FILENAME}), 200
-
-@app.route('/ai_response', methods=['GET'])
-def ai_response():
-    output_path = pathlib.Path(GEMINI_OUTPUT_MD)
-
-    # Run Gemini if output doesn't exist
-    if not output_path.exists():
-        subprocess.run(['python', 'gemini_v2.py'], capture_output=True, text=True)
-
-    if output_path.exists():
-        try:
-            with output_path.open('r', encoding='utf-8') as f:
-                content = f.read()
-            return jsonify({"response": content})
-        except Exception as e:
-            return jsonify({"error": f"Failed to read Gemini output: {e}"}), 500
-    else:
-        return jsonify({"response": "No Gemini output file found."})
-
-@app.route('/download_gemini_output', methods=['GET'])
-def download_gemini_output():
-    output_path = pathlib.Path(GEMINI_OUTPUT_MD)
-    if output_path.exists():
-        return send_from_directory('.', GEMINI_OUTPUT_MD, as_attachment=True)
-    else:
+    # an explicit catalog key, or a year/term/campus choice resolved to the newest match
+    try:
+        catalogs = get_engine().catalogs
+        catalog = request.form.get('catalog') or catalogs.resolve(
+            request.form.get('year'), request.form.get('term'), request.form.get('campus'))
+        if catalog:
+            catalogs.get(catalog)
+    except CatalogError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # the body has been received by now (at most MAX_CONTENT_LENGTH); check it is really a PDF
+    stream = file.stream
+    if not is_pdf(stream.read(HEADER_BYTES)):
+        return jsonify({'error': 'Only PDF resumes are accepted.'}), 400
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+
+    params = {'catalog': catalog}
+    try:
+        if size <= app.config['UPLOAD_MEMORY_BYTES']:
+            # nothing is written to disk. Warm start: if the job will run at once, text extraction
+            # and step 1 begin here, after it has its queue slot (so a 503 costs no model calls).
+            # A job that has to queue keeps the bytes and starts its stages when it runs, so
+            # no more than MAX_CONCURRENT_JOBS analyses call Gemini at a time.
+            def save(workdir):
+                if job_queue.pending() > job_queue.max_workers:
+                    params['resume'] = stream.read()
+                    return
+                params['trace'] = Trace()
+                with params['trace'].activate():
+                    params['prefetch'] = get_engine().prefetch(stream.read(), catalog)
+        else:
+            def save(workdir):
+                with span('upload_save'):
+                    file.save(os.path.join(workdir, RESUME_FILENAME))
+        job = job_queue.submit(save, params=params)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except RecommendationError as e:
+        return jsonify({'error': str(e)}), 500
+    if 'prefetch' in params:
+        job.on_cancel(params['prefetch'].cancel)
+
+    # a new upload from the same page supersedes the analysis it was showing
+    replaces = request.form.get('replaces', '')
+    if JOB_ID_RE.match(replaces):
+        job_queue.cancel(replaces)
+
+    return jsonify({'success': True, 'filename': file.filename, 'job_id': job.id}), 202
+
+def format_size(n):
+    """'10 MB', '1.5 MB', '512 KB' or '900 bytes'."""
+    for unit, size in (('MB', 1024 * 1024), ('KB', 1024)):
+        if n >= size:
+            return f"{round(n / size, 1):g} {unit}"
+    return f"{n} bytes"
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({'error': f"File too large; the limit is {format_size(app.config['MAX_CONTENT_LENGTH'])}."}), 413
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Stop a queued or running analysis (POST, so pages can send it with navigator.sendBeacon)."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    if job.status == FAILED:
+        return jsonify({"status": job.status, "error": job.error}), 500
+    if job.status == CANCELLED:
+        return jsonify({"status": job.status}), 410
+    if job.status != DONE:
+        return jsonify({"status": job.status}), 202
+    body = {"status": job.status, "response": job.result}
+    if app.config['INCLUDE_TRACE'] or request.args.get('trace'):
+        body["trace"] = job.trace
+    return jsonify(body)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events for a job: status, major, markdown deltas, result, then done/error."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        start = 0
+
+    def generate():
+        idx = start
+        while True:
+            events, finished = job.wait_events(idx)
+            for event, data in events:
+                yield format_sse(idx, event, data)
+                idx += 1
+            if finished and idx >= len(job.events):
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/jobs/<job_id>/download', methods=['GET'])
+def download_job_output(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job.status != DONE or not (job.workdir / GEMINI_OUTPUT_MD).exists():
         return jsonify({"error": "Gemini output file not found."}), 404
+    return send_from_directory(job.workdir.resolve(), GEMINI_OUTPUT_MD, as_attachment=True)
+
+@app.route('/catalogs', methods=['GET'])
+def list_catalogs():
+    """Loaded catalogs (key, year, term, campus, version, size) and the default key."""
+    return jsonify(get_engine().catalogs.describe())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage latency histograms, Gemini calls/retries/tokens, cache hit rates."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server; production runs under gunicorn (see wsgi.py)
+    app.run(debug=app.config['DEBUG'])
@@ -0,0 +1,131 @@
+"""Analyse a directory (or manifest) of resumes through one shared RecommendationEngine.
+
+    python batch.py resumes/ --out results/ --concurrency 8 --rpm 60 --tpm 250000
+    python batch.py manifest.txt --out results/        # one PDF path per line (or a JSON list)
+
+Each resume gets results/<name>-<hash>/ with resume_recommendation.md and .json. Completed
+resumes are appended to a checkpoint file, so re-running the same command after an
+interruption only processes what is left. A summary.json is written at the end. Throughput
+is bounded by the --rpm/--tpm quota enforced in gemini_client.GeminiClient.
+"""
+import argparse
+import hashlib
+import json
+import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from gemini_v2 import RecommendationEngine, RecommendationError, courses_path
+from response_cache import ResponseCache
+from gemini_client import DEFAULT_RPM, DEFAULT_TPM
+
+
+def list_resumes(source):
+    """PDFs in a directory, or the paths listed in a manifest (text lines or a JSON list)."""
+    source = pathlib.Path(source)
+    if source.is_dir():
+        return sorted(p for p in source.iterdir() if p.suffix.lower() == '.pdf')
+    text = source.read_text(encoding='utf-8')
+    if text.lstrip().startswith('['):
+        entries = json.loads(text)
+    else:
+        entries = [ln.strip() for ln in text.splitlines() if ln.strip() and not ln.lstrip().startswith('#')]
+    # relative manifest entries are relative to the manifest itself
+    return [p if p.is_absolute() else source.parent / p for p in map(pathlib.Path, entries)]
+
+
+def load_checkpoint(path):
+    done = {}
+    if path.exists():
+        for line in path.read_text(encoding='utf-8').splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by the interruption
+            if entry.get('status') == 'done':
+                done[entry['resume']] = entry
+    return done
+
+
+def result_dir(out, resume):
+    digest = hashlib.sha256(str(resume.resolve()).encode('utf-8')).hexdigest()[:8]
+    return out / f"{resume.stem}-{digest}"
+
+
+def run_batch(resumes, out, engine, concurrency=4, checkpoint=None):
+    out.mkdir(parents=True, exist_ok=True)
+    checkpoint = checkpoint or out / 'checkpoint.jsonl'
+    done = load_checkpoint(checkpoint)
+    todo = [r for r in resumes if str(r) not in done]
+    print(f"{len(resumes)} resumes, {len(done)} already done, {len(todo)} to process")
+
+    lock = threading.Lock()
+
+    def process(resume):
+        workdir = result_dir(out, resume)
+        workdir.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        entry = {'resume': str(resume), 'output': str(workdir / 'resume_recommendation.md')}
+        try:
+            engine.recommend(resume, workdir / 'resume_recommendation.md')
+            entry['status'] = 'done'
+        except RecommendationError as e:
+            entry.update(status='failed', error=str(e))
+        entry['seconds'] = round(time.monotonic() - start, 2)
+        with lock, checkpoint.open('a', encoding='utf-8') as fh:
+            fh.write(json.dumps(entry) + '\n')
+        return entry
+
+    results = list(done.values())
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(process, r) for r in todo]
+        for i, fut in enumerate(as_completed(futures), 1):
+            entry = fut.result()
+            results.append(entry)
+            print(f"[{i}/{len(todo)}] {entry['status']}: {entry['resume']} ({entry['seconds']}s)")
+
+    summary = {
+        'total': len(resumes),
+        'done': sum(1 for r in results if r['status'] == 'done'),
+        'failed': sum(1 for r in results if r['status'] == 'failed'),
+        'results': sorted(results, key=lambda r: r['resume']),
+    }
+    (out / 'summary.json').write_text(json.dumps(summary, indent=2), encoding='utf-8')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='directory of PDFs or a manifest file')
+    parser.add_argument('--out', default='batch_results')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rpm', type=int, default=DEFAULT_RPM, help='Gemini requests per minute quota')
+    parser.add_argument('--tpm', type=int, default=DEFAULT_TPM, help='Gemini tokens per minute quota')
+    parser.add_argument('--checkpoint', help='checkpoint file (default: <out>/checkpoint.jsonl)')
+    parser.add_argument('--catalog', default=str(courses_path))
+    parser.add_argument('--single-call', action='store_true', help='one structured-output call per resume')
+    parser.add_argument('--cache', default='cache/responses.sqlite3', help="response cache path ('' to disable)")
+    args = parser.parse_args()
+
+    try:
+        engine = RecommendationEngine(
+            args.catalog,
+            cache=ResponseCache(args.cache) if args.cache else None,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            single_call=args.single_call,
+        )
+    except RecommendationError as e:
+        raise SystemExit(str(e))
+    out = pathlib.Path(args.out)
+    summary = run_batch(
+        list_resumes(args.source), out, engine,
+        concurrency=args.concurrency,
+        checkpoint=pathlib.Path(args.checkpoint) if args.checkpoint else None,
+    )
+    print(f"✅ {summary['done']} done, {summary['failed']} failed — summary in {out / 'summary.json'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Compare load time and resident memory of the JSON catalog and the compact .rucat catalog.
+
+Each case runs in a fresh interpreter so RSS numbers are not polluted by earlier cases. The
+"+ indexes" cases are what a Catalog costs: building its indexes reads every record, so the
+binary file's lazy loading only pays off for readers that touch a few records.
+
+    python bench_catalog.py [rutgers_courses_2025_9_NB.json]
+"""
+import pathlib
+import subprocess
+import sys
+
+from catalog_binary import SUFFIX, convert
+
+CASE = r'''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+from catalog_binary import load_catalog
+from catalog_tables import is_normalized, expand
+from catalog_index import CatalogIndex
+from course_matcher import CourseMatcher
+before = rss_kb()
+start = time.perf_counter()
+if {binary!r}:
+    courses = load_catalog({path!r})
+else:
+    with open({path!r}, encoding='utf-8') as fh:
+        courses = json.load(fh)
+    if is_normalized(courses):
+        courses = expand(courses)
+if {index!r}:
+    CatalogIndex(courses)
+    CourseMatcher(courses)
+elapsed = time.perf_counter() - start
+print(f"{{elapsed * 1000:.1f}} {{rss_kb() - before}}")
+'''
+
+
+def run_case(path, binary, index, repeat=5):
+    code = CASE.format(root=str(pathlib.Path(__file__).resolve().parent), path=str(path), binary=binary, index=index)
+    times, rss = [], []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        rss.append(int(out[1]))
+    times.sort()
+    return times[len(times) // 2], max(rss)
+
+
+def main():
+    json_path = pathlib.Path(sys.argv[1] if len(sys.argv) > 1 else 'rutgers_courses_2025_9_NB.json')
+    bin_path = json_path.with_suffix(SUFFIX)
+    if not bin_path.exists() or bin_path.stat().st_mtime < json_path.stat().st_mtime:
+        convert(json_path, bin_path)
+
+    print(f"JSON   {json_path} ({json_path.stat().st_size // 1024} KB)")
+    print(f"Binary {bin_path} ({bin_path.stat().st_size // 1024} KB)")
+    print(f"{'case':<28}{'median load ms':>16}{'RSS delta KB':>14}")
+    for label, path, binary, index in (
+        ('json load', json_path, False, False),
+        ('binary load (lazy)', bin_path, True, False),
+        ('json load + indexes', json_path, False, True),
+        ('binary load + indexes', bin_path, True, True),
+    ):
+        ms, kb = run_case(path, binary, index)
+        print(f"{label:<28}{ms:>16.1f}{kb:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""Benchmarks for the recommendation pipeline that run offline against fake_gemini.FakeClient.
+
+    python bench_pipeline.py micro [--scales 1,10,100]
+    python bench_pipeline.py load [--requests 200 --concurrency 16 --latency 0.5 --jitter 0.1 --workers 8]
+
+`micro` times the local stages (catalog load, index build, course selection, matching and
+markdown post-processing) on the catalog replicated 1x/10x/100x. `load` serves app.py on a
+local port with the fake model behind it, drives /upload from concurrent clients until each
+job's result is ready, and reports latency percentiles, throughput and peak RSS.
+"""
+import argparse
+import json
+import os
+import pathlib
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_gemini import FakeClient, STEP2_MARKDOWN
+
+CATALOG = pathlib.Path('rutgers_courses_2025_9_NB.json')
+MAJORS = ('computer', 'electrical', 'math', 'psychology', 'undecided')
+RESUME_LINES = (
+    "Jane Doe - Rutgers University, B.S. Computer Science",
+    "Experience: software engineering intern, Python, SQL, data analysis, machine learning models",
+    "Projects: compilers course project, web application with React, statistics dashboard",
+    "Skills: linear algebra, probability, algorithms, operating systems, cloud computing",
+)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def make_pdf(lines):
+    """A minimal one-page PDF with the given text lines (readable by pypdf and pdf_text)."""
+    def esc(s):
+        return s.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    text = ''.join(f"({esc(ln)}) Tj T* " for ln in lines)
+    stream = f"BT /F1 11 Tf 14 TL 72 720 Td {text}ET".encode('latin-1')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b''.join(f"{off:010d} 00000 n \n".encode() for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def scaled_catalog(courses, scale):
+    """The catalog repeated `scale` times; copies get a different school prefix, same titles."""
+    out = []
+    for k in range(scale):
+        for c in courses:
+            if k:
+                parts = str(c.get('course_code') or '').split(':')
+                if len(parts) == 3:
+                    parts[0] = f"{(int(parts[0]) + 50 + k) % 100:02d}" if parts[0].isdigit() else parts[0]
+                c = {**c, 'course_code': ':'.join(parts)}
+            out.append(c)
+    return out
+
+
+def timed(fn, repeat=1):
+    """Median wall time of fn() in milliseconds, and its last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def micro(scales):
+    from catalog_binary import convert, load_catalog
+    from catalog_index import CatalogIndex
+    from context_builder import ContextBuilder
+    from course_matcher import CourseMatcher
+    from course_retrieval import CourseRetriever
+    from catalog_registry import course_list
+    from postprocess import parse_response
+    from pdf_text import compact
+
+    base = course_list(json.loads(CATALOG.read_text(encoding='utf-8')))
+    resume = compact('\n'.join(RESUME_LINES))
+    titles = [ln.split('**')[1] for ln in STEP2_MARKDOWN.splitlines() if '**' in ln]
+    print(f"{'scale':>5}{'courses':>9}{'json ms':>10}{'rucat ms':>10}{'index ms':>10}"
+          f"{'select ms':>11}{'match us':>10}{'post ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            courses = scaled_catalog(base, scale)
+            json_path = pathlib.Path(tmp) / f"catalog_{scale}.json"
+            json_path.write_text(json.dumps(courses), encoding='utf-8')
+            bin_path = convert(json_path)
+
+            json_ms, _ = timed(lambda: json.loads(json_path.read_bytes()), repeat=3)
+            bin_ms, _ = timed(lambda: len(load_catalog(bin_path)), repeat=3)
+
+            def build():
+                index = CatalogIndex(courses)
+                retriever = CourseRetriever.build(courses) if CourseRetriever.available() else None
+                return index, CourseMatcher(courses), ContextBuilder(index), retriever
+            index_ms, (index, matcher, context, retriever) = timed(build)
+
+            def select():
+                for major in MAJORS:
+                    ids = index.search(major)
+                    if retriever is not None:
+                        ids = retriever.search(resume, boost=ids)
+                    else:
+                        ids = context.rank(ids or range(len(courses)), resume)
+                    context.pack(ids)
+            select_ms, _ = timed(select, repeat=5)
+            match_ms, _ = timed(lambda: [matcher.match(t) for t in titles], repeat=5)
+            post_ms, _ = timed(lambda: parse_response(STEP2_MARKDOWN).annotate(matcher).to_markdown(), repeat=5)
+            print(f"{scale:>5}{len(courses):>9}{json_ms:>10.1f}{bin_ms:>10.1f}{index_ms:>10.1f}"
+                  f"{select_ms / len(MAJORS):>11.2f}{match_ms * 1000 / len(titles):>10.1f}{post_ms:>9.2f}")
+    print(f"peak RSS {peak_rss_mb():.0f} MB")
+
+
+def multipart(field, filename, data, mime='application/pdf'):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {mime}\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def load(n_requests, concurrency, latency, jitter, workers, single_call, poll):
+    # app.py reads its settings at import, so point it at throwaway storage first
+    tmp = tempfile.mkdtemp(prefix='bench-')
+    os.environ.update({
+        'UPLOAD_FOLDER': os.path.join(tmp, 'jobs'),
+        'RESPONSE_CACHE_PATH': os.path.join(tmp, 'responses.sqlite3'),
+        'METRICS_DIR': '',
+        'MAX_CONCURRENT_JOBS': str(workers),
+        'MAX_PENDING_JOBS': str(max(n_requests, 64)),
+    })
+    from werkzeug.serving import make_server
+    import app as web
+    from gemini_v2 import RecommendationEngine
+
+    fake = FakeClient(latency=latency, jitter=jitter)
+    web._engine = RecommendationEngine(client=fake, cache=web.response_cache, single_call=single_call,
+                                       rpm=10 ** 6, tpm=10 ** 9, prefetch_workers=web.app.config['PREFETCH_WORKERS'])
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    def one(i):
+        # a distinct resume per request, so the response cache never answers
+        body, ctype = multipart('resume', f"resume{i}.pdf", make_pdf(RESUME_LINES + (f"Applicant {i}",)))
+        start = time.perf_counter()
+        req = urllib.request.Request(f"{base}/upload", data=body, headers={'Content-Type': ctype})
+        with urllib.request.urlopen(req) as resp:
+            job_id = json.load(resp)['job_id']
+        while True:
+            with urllib.request.urlopen(f"{base}/jobs/{job_id}") as resp:
+                status = json.load(resp)['status']
+            if status in ('done', 'failed'):
+                return time.perf_counter() - start, status
+            time.sleep(poll)
+
+    print(f"{n_requests} requests, concurrency {concurrency}, {workers} job workers, "
+          f"fake latency {latency}s +/- {jitter}s per call{' (single call)' if single_call else ''}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - start
+    server.shutdown()
+    web.job_queue.shutdown()
+
+    latencies = [t for t, status in results if status == 'done']
+    failed = sum(1 for _, status in results if status != 'done')
+    print(f"done {len(latencies)}, failed {failed}, model calls {fake.models.calls}")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms  p95 {percentile(latencies, 0.95) * 1000:.0f} ms"
+          f"  p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+    print(f"throughput {len(latencies) / wall:.2f} req/s over {wall:.1f}s, peak RSS {peak_rss_mb():.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    m = sub.add_parser('micro', help='local stages at several catalog sizes')
+    m.add_argument('--scales', default='1,10,100')
+    lt = sub.add_parser('load', help='concurrent /upload load test')
+    lt.add_argument('--requests', type=int, default=100)
+    lt.add_argument('--concurrency', type=int, default=8)
+    lt.add_argument('--latency', type=float, default=0.5, help='seconds per fake model call')
+    lt.add_argument('--jitter', type=float, default=0.1)
+    lt.add_argument('--workers', type=int, default=4, help='MAX_CONCURRENT_JOBS')
+    lt.add_argument('--single-call', action='store_true')
+    lt.add_argument('--poll', type=float, default=0.02, help='result polling interval in seconds')
+    args = parser.parse_args()
+
+    if args.command == 'micro':
+        micro([int(s) for s in args.scales.split(',')])
+    else:
+        load(args.requests, args.concurrency, args.latency, args.jitter, args.workers, args.single_call, args.poll)
+
+
+if __name__ == '__main__':
+    main()
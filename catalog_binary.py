@@ -0,0 +1,163 @@
+"""Compact, columnar, string-interned course catalog format (.rucat) with a memory-mapped loader.
+
+Layout (all integers little-endian uint32):
+    header   magic b'RUCAT2\\0\\0', source hash (16 bytes), n_courses, n_strings, n_refs
+    strings  n_strings + 1 offsets into the UTF-8 blob, then the blob
+    columns  major[n], course_code[n], course_title[n] (string ids),
+             ref_start[n + 1], ref_ids[n_refs]
+
+The ref columns hold each course's cross-listed codes. Version 1 files (RUCAT1) kept
+instructor names there; they are still readable, but the names are never returned.
+Every distinct string is stored once and records are materialized only when indexed, so
+opening a file costs almost nothing. The file holds only major, code, title and cross-listed
+codes (not the other listings' majors), and the server does not load it: a Catalog
+(catalog_registry.py) reads every record to build its index, matcher, context builder and
+retriever, and that takes longer than from JSON (see bench_catalog.py). The format is a
+converter output for tools that read a few records and for bench_catalog.py.
+"""
+import array
+import hashlib
+import json
+import mmap
+import pathlib
+import struct
+import sys
+from collections.abc import Sequence
+
+from catalog_tables import is_normalized, expand, public
+
+MAGIC = b'RUCAT2\0\0'
+MAGIC_V1 = b'RUCAT1\0\0'
+HEADER = struct.Struct('<8s16sIII')
+SUFFIX = '.rucat'
+
+
+def _u32(values):
+    arr = array.array('I', values)
+    if sys.byteorder != 'little':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def write_catalog(courses, path, source_hash=b''):
+    """Write course records (major/course_code/course_title/cross_listed) to a .rucat file."""
+    strings = {}
+
+    def intern(s):
+        s = str(s or '')
+        if s not in strings:
+            strings[s] = len(strings)
+        return strings[s]
+
+    majors, codes, titles, starts, refs = [], [], [], [0], []
+    for c in courses:
+        if not isinstance(c, dict):
+            continue
+        majors.append(intern(c.get('major')))
+        codes.append(intern(c.get('course_code')))
+        titles.append(intern(c.get('course_title')))
+        refs.extend(intern(code) for code in (c.get('cross_listed') or []))
+        starts.append(len(refs))
+
+    blob = bytearray()
+    offsets = [0]
+    for s in strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+
+    path = pathlib.Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with tmp.open('wb') as fh:
+        fh.write(HEADER.pack(MAGIC, source_hash[:16].ljust(16, b'\0'), len(majors), len(strings), len(refs)))
+        fh.write(_u32(offsets))
+        fh.write(blob)
+        # keep the integer columns 4-byte aligned so they can be cast in place
+        fh.write(b'\0' * (-fh.tell() % 4))
+        for column in (majors, codes, titles, starts, refs):
+            fh.write(_u32(column))
+    tmp.replace(path)
+    return path
+
+
+def convert(json_path, out_path=None):
+    """Convert a catalog JSON file written by coursescrapper.py (normalized or a flat record
+    list) into a .rucat file next to it."""
+    json_path = pathlib.Path(json_path)
+    raw = json_path.read_bytes()
+    data = json.loads(raw.decode('utf-8'))
+    courses = expand(data) if is_normalized(data) else [public(c) for c in data if isinstance(c, dict)]
+    out_path = pathlib.Path(out_path) if out_path else json_path.with_suffix(SUFFIX)
+    return write_catalog(courses, out_path, hashlib.sha256(raw).digest())
+
+
+class BinaryCatalog(Sequence):
+    """Read-only sequence of course dicts backed by a memory-mapped .rucat file."""
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        with self.path.open('rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, source_hash, n, n_strings, n_refs = HEADER.unpack_from(self._mm, 0)
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f"{self.path} is not a .rucat catalog")
+        self._has_cross_listed = magic == MAGIC
+        self.source_hash = source_hash.hex()
+        self._n = n
+        view = memoryview(self._mm)
+        pos = HEADER.size
+        self._offsets = self._column(view, pos, n_strings + 1)
+        pos += 4 * (n_strings + 1)
+        self._blob_start = pos
+        pos += self._offsets[-1] if n_strings else 0
+        pos += -pos % 4
+        self._majors = self._column(view, pos, n)
+        self._codes = self._column(view, pos + 4 * n, n)
+        self._titles = self._column(view, pos + 8 * n, n)
+        self._starts = self._column(view, pos + 12 * n, n + 1)
+        self._refs = self._column(view, pos + 16 * n + 4, n_refs)
+        self._strings = [None] * n_strings
+
+    @staticmethod
+    def _column(view, pos, count):
+        col = view[pos:pos + 4 * count]
+        if sys.byteorder == 'little':
+            return col.cast('I')
+        arr = array.array('I', col.tobytes())
+        arr.byteswap()
+        return arr
+
+    def string(self, i):
+        s = self._strings[i]
+        if s is None:
+            start = self._blob_start + self._offsets[i]
+            s = self._strings[i] = self._mm[start:self._blob_start + self._offsets[i + 1]].decode('utf-8')
+        return s
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        record = {
+            'major': self.string(self._majors[i]),
+            'course_code': self.string(self._codes[i]),
+            'course_title': self.string(self._titles[i]),
+        }
+        if self._has_cross_listed and self._starts[i + 1] > self._starts[i]:
+            record['cross_listed'] = [self.string(j) for j in self._refs[self._starts[i]:self._starts[i + 1]]]
+        return record
+
+
+def load_catalog(path):
+    return BinaryCatalog(path)
+
+
+if __name__ == '__main__':
+    for arg in sys.argv[1:] or ['rutgers_courses_2025_9_NB.json']:
+        out = convert(arg)
+        print(f"✅ Wrote {out} ({out.stat().st_size} bytes, from {pathlib.Path(arg).stat().st_size} bytes of JSON)")
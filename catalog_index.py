@@ -0,0 +1,112 @@
+import bisect
+import re
+
+# Words that appear in almost every major/title and carry no signal on their own
+STOP_WORDS = {'and', 'of', 'the', 'in', 'to', 'for', 'a', 'an', 'on', 'with', 'i', 'ii', 'iii', 'iv'}
+
+# One-word majors the step-1 model tends to return, mapped to extra index tokens (subject numbers or words)
+SYNONYMS = {
+    'ece': ['332'],
+    'electrical': ['332'],
+    'computer': ['198'],
+    'cs': ['198'],
+    'compsci': ['198'],
+    'mechanical': ['650'],
+    'aerospace': ['650'],
+    'civil': ['180'],
+    'bme': ['125'],
+    'biomedical': ['125'],
+    'ise': ['540'],
+    'industrial': ['540'],
+    'math': ['640', '642'],
+    'stats': ['960'],
+    'statistics': ['960', '954'],
+    'data': ['219', '954'],
+    'econ': ['220'],
+    'psych': ['830'],
+    'polisci': ['790'],
+    'bio': ['119'],
+    'biology': ['119'],
+    'chem': ['160'],
+    'finance': ['390'],
+    'accounting': ['010'],
+    'marketing': ['630'],
+    'nursing': ['705'],
+    'pharmacy': ['720'],
+}
+
+# Prefix matching is only used for query tokens at least this long, so 'cs' does not match 'csr...'
+MIN_PREFIX = 3
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", str(text).lower()) if t not in STOP_WORDS]
+
+
+def subject_of(course_code):
+    """Return the subject number from a course code like '01:198:111', or ''."""
+    parts = str(course_code or '').split(':')
+    return parts[1] if len(parts) == 3 else ''
+
+
+class CatalogIndex:
+    """Inverted index over the course catalog, built once at load time.
+
+    Tokens from `major`, the subject number in `course_code` and `course_title` map to
+    course IDs (positions in the course list), so a major lookup is a dictionary hit.
+    A cross-listed course is found under each of its codes, their subjects and their majors.
+    """
+
+    def __init__(self, courses, synonyms=SYNONYMS):
+        self.courses = courses
+        self.synonyms = synonyms
+        self.postings = {}
+        self.by_code = {}
+        for course_id, c in enumerate(courses):
+            if not isinstance(c, dict):
+                continue
+            tokens = set(tokenize(c.get('major', '')))
+            for major in c.get('cross_listed_majors') or ():
+                tokens.update(tokenize(major))
+            tokens.update(tokenize(c.get('course_title', '')))
+            for code in [c.get('course_code') or '', *(c.get('cross_listed') or ())]:
+                if code:
+                    self.by_code.setdefault(code, course_id)
+                subject = subject_of(code)
+                if subject:
+                    tokens.add(subject)
+            for tok in tokens:
+                self.postings.setdefault(tok, []).append(course_id)
+        self.tokens = sorted(self.postings)
+
+    def _token_ids(self, tok, prefix):
+        ids = set(self.postings.get(tok, ()))
+        if prefix and len(tok) >= MIN_PREFIX:
+            i = bisect.bisect_left(self.tokens, tok)
+            while i < len(self.tokens) and self.tokens[i].startswith(tok):
+                ids.update(self.postings[self.tokens[i]])
+                i += 1
+        for extra in self.synonyms.get(tok, ()):
+            ids.update(self.postings.get(extra, ()))
+        return ids
+
+    def search(self, query, prefix=True):
+        """Return sorted course IDs matching every word of the query (with prefix and synonym expansion)."""
+        words = tokenize(query)
+        if not words:
+            return []
+        ids = None
+        for tok in words:
+            hits = self._token_ids(tok, prefix)
+            ids = hits if ids is None else ids & hits
+            if not ids:
+                return []
+        return sorted(ids)
+
+    def lookup(self, query, prefix=True):
+        """Return the course records matching the query, in catalog order."""
+        return [self.courses[i] for i in self.search(query, prefix)]
+
+    def get_by_code(self, course_code):
+        course_id = self.by_code.get(course_code)
+        return None if course_id is None else self.courses[course_id]
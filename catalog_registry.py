@@ -0,0 +1,252 @@
+"""Loaded course catalogs, one per year/term/campus, swapped atomically when their files change.
+
+A Catalog bundles a parsed catalog with everything derived from it (index, matcher, retrieval
+matrix, course-list cache) and is never modified after it is built. A request takes one
+Catalog from the registry when it starts and uses only that object. A background reload
+builds a replacement off to the side and then swaps a single dictionary entry, so in-flight
+requests never block on a reload and never see a half-built catalog.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from catalog_index import CatalogIndex, subject_of
+from catalog_tables import is_normalized, expand, public
+from context_builder import ContextBuilder, CONTEXT_TOKENS
+from course_matcher import CourseMatcher
+from course_retrieval import CourseRetriever
+from metrics import span
+
+# Files written by coursescrapper.py: rutgers_courses_<year>_<term>_<campus>.json
+CATALOG_RE = re.compile(r"^rutgers_courses_(\d{4})_(\d{1,2})_([A-Za-z0-9]+)$")
+RELOAD_SECONDS = float(os.getenv("CATALOG_RELOAD_SECONDS", "60"))
+
+
+class CatalogError(RuntimeError):
+    """Raised when a catalog cannot be loaded or a requested catalog does not exist."""
+
+
+def course_list(courses_data):
+    """Return the course records of a loaded catalog (normalized document, list, or dict of
+    lists), without instructor names."""
+    if is_normalized(courses_data):
+        return expand(courses_data)
+    if isinstance(courses_data, dict):
+        lists = [v for v in courses_data.values() if isinstance(v, list)]
+        courses_data = lists[0] if lists else []
+    if isinstance(courses_data, list):
+        # a flat catalog from before the normalized format: drop instructors once, at load
+        return [public(c) if isinstance(c, dict) else c for c in courses_data]
+    return []
+
+
+def catalog_digest(courses):
+    """Compact '<subject>|<name>|<course count>' lines, one per subject, for the single-call prompt."""
+    subjects = {}
+    for c in courses:
+        subject = subject_of(c.get('course_code') or c.get('code'))
+        if not subject:
+            continue
+        name, count = subjects.get(subject, (c.get('major') or '', 0))
+        subjects[subject] = (name, count + 1)
+    return '\n'.join(f"{subject}|{name}|{count}" for subject, (name, count) in sorted(subjects.items()))
+
+
+def catalog_key(path):
+    """'2025_9_NB' for rutgers_courses_2025_9_NB.json; the file stem otherwise."""
+    stem = pathlib.Path(path).stem
+    m = CATALOG_RE.match(stem)
+    return '_'.join(m.groups()) if m else stem
+
+
+def file_stamp(path):
+    st = pathlib.Path(path).stat()
+    return st.st_mtime_ns, st.st_size
+
+
+class Catalog:
+    """One loaded catalog and the structures built from it. Read-only once constructed."""
+
+    def __init__(self, path, key=None, context_tokens=CONTEXT_TOKENS, retrieval=True):
+        self.path = pathlib.Path(path)
+        self.key = key or catalog_key(self.path)
+        if not self.path.exists():
+            raise CatalogError(f"Courses catalog file not found at {self.path.resolve()}")
+        # parse + index build; measured so slow catalog loads show up in /metrics
+        with span('catalog_load'):
+            self.stamp = file_stamp(self.path)
+            try:
+                raw = self.path.read_bytes()
+                data = json.loads(raw.decode('utf-8'))
+            except Exception as e:
+                raise CatalogError(f"Failed to read or parse courses catalog {self.path}: {e}")
+            # Content hash of the catalog JSON; part of the cache key for recommendations
+            self.version = hashlib.sha256(raw).hexdigest()[:16]
+            # only the records are kept, so the parsed document (and any instructor table) is freed
+            self.courses = course_list(data)
+            self.index = CatalogIndex(self.courses)
+
+            # Built once; reused by every request for code matching
+            self.matcher = CourseMatcher(self.courses)
+            self.digest = catalog_digest(self.courses)
+            # Ranks step-2 candidates against the resume and bounds the course list size
+            self.context = ContextBuilder(self.index, budget=context_tokens)
+            # BM25 over titles/majors (needs numpy); saved per catalog version
+            self.retriever = None
+            if retrieval and CourseRetriever.available():
+                self.retriever = CourseRetriever.load_or_build(self.courses, self.version)
+        self.loaded = time.time()
+        # per-major step-2 candidates for this catalog (see RecommendationEngine.major_courses)
+        self.contexts = OrderedDict()
+        self.contexts_lock = threading.Lock()
+
+    def describe(self):
+        m = CATALOG_RE.match(self.path.stem)
+        year, term, campus = m.groups() if m else ('', '', '')
+        return {
+            "key": self.key,
+            "year": year,
+            "term": term,
+            "campus": campus,
+            "version": self.version,
+            "courses": len(self.courses),
+            "path": str(self.path),
+            "loaded": self.loaded,
+        }
+
+
+class CatalogRegistry:
+    """The catalogs found in `directory` (plus explicit `paths`), keyed like '2025_9_NB'.
+
+    refresh() picks up new and changed files; start() runs it every `interval` seconds on a
+    daemon thread. Only catalogs whose file changed are rebuilt, and cached recommendations
+    and retrieval matrices are keyed by catalog version, so they carry over for the rest.
+    Only JSON catalogs are loaded; a .rucat copy (catalog_binary.py) is for offline tools.
+    """
+
+    def __init__(self, paths=(), directory=None, default=None, interval=RELOAD_SECONDS, **catalog_options):
+        self.paths = [pathlib.Path(p) for p in paths]
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        self.interval = interval
+        self.catalog_options = catalog_options
+        self._catalogs = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        self.refresh()
+        if not self._catalogs:
+            raise CatalogError(f"No course catalogs found (paths: {[str(p) for p in self.paths]}, directory: {self.directory})")
+        self.default = catalog_key(default) if default else catalog_key(self.paths[0]) if self.paths else None
+        if self.default not in self._catalogs:
+            self.default = max(self._catalogs, key=self._sort_key)
+
+    def discover(self):
+        """Current {key: path} of catalog files on disk."""
+        candidates = list(self.paths)
+        if self.directory is not None and self.directory.is_dir():
+            candidates += [p for p in self.directory.iterdir()
+                           if p.suffix == '.json' and CATALOG_RE.match(p.stem)]
+        by_key = {}
+        for path in candidates:
+            if path.exists():
+                by_key.setdefault(catalog_key(path), set()).add(path)
+        # an explicit path and a discovered one can name the same catalog; the newest file wins
+        return {key: max(paths, key=lambda p: p.stat().st_mtime_ns) for key, paths in by_key.items()}
+
+    def refresh(self):
+        """Load new catalogs and rebuild changed ones. Returns the keys that were (re)loaded."""
+        loaded = []
+        with self._refresh_lock:
+            for key, path in self.discover().items():
+                current = self._catalogs.get(key)
+                try:
+                    if current is not None and current.path == path and current.stamp == file_stamp(path):
+                        continue
+                    catalog = Catalog(path, key, **self.catalog_options)
+                except (CatalogError, OSError) as e:
+                    if path in self.paths and current is None:
+                        raise CatalogError(str(e))  # an explicitly configured catalog must load
+                    print(f"Warning: keeping previous catalog {key}: {e}")
+                    continue
+                if current is not None and current.version == catalog.version:
+                    # touched but unchanged (e.g. rewritten by a refresh that found no changes)
+                    catalog = current
+                with self._lock:
+                    self._catalogs[key] = catalog
+                if catalog is not current:
+                    loaded.append(key)
+                    print(f"Loaded catalog {key} version {catalog.version} ({len(catalog.courses)} courses) from {path}")
+        return loaded
+
+    def get(self, key=None):
+        """The current Catalog for `key` (default catalog if None). Hold on to it for the whole request."""
+        if self._thread_pid is not None and self._thread_pid != os.getpid():
+            self.start()  # started before a fork: the thread did not survive it
+        with self._lock:
+            catalog = self._catalogs.get(key or self.default)
+        if catalog is None:
+            raise CatalogError(f"Unknown catalog '{key}'. Available: {', '.join(sorted(self._catalogs))}")
+        return catalog
+
+    @staticmethod
+    def _sort_key(key):
+        return tuple(int(p) if p.isdigit() else 0 for p in key.split('_')[:2])
+
+    def resolve(self, year=None, term=None, campus=None):
+        """Key of the catalog for a year/term/campus choice; missing parts match anything and the
+        most recent matching term wins. None when nothing was chosen."""
+        if not (year or term or campus):
+            return None
+        with self._lock:
+            keys = list(self._catalogs)
+        matches = []
+        for key in keys:
+            parts = key.split('_')
+            if len(parts) != 3:
+                continue
+            y, t, c = parts
+            if (year and str(year) != y) or (term and str(term) != t) or (campus and str(campus).upper() != c.upper()):
+                continue
+            matches.append(key)
+        if not matches:
+            raise CatalogError(f"No catalog for year={year or '*'} term={term or '*'} campus={campus or '*'}")
+        return max(matches, key=self._sort_key)
+
+    def describe(self):
+        with self._lock:
+            catalogs = list(self._catalogs.values())
+        return {"default": self.default, "catalogs": [c.describe() for c in sorted(catalogs, key=lambda c: c.key)]}
+
+    def start(self):
+        """Start the background reload thread in this process (again after a fork). Cheap to
+        call repeatedly: it does nothing while this process's thread is running."""
+        if not self.interval or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._reload_loop, name="catalog-reload", daemon=True)
+            self._thread.start()
+
+    def _after_fork(self):
+        # the reload thread is gone in the child, and may have held these locks at fork time
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def _reload_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: catalog reload failed: {e}")
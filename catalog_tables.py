@@ -0,0 +1,195 @@
+"""Normalized catalog JSON (format 2), as written by coursescrapper.py.
+
+    {"format": 2,
+     "majors": ["Computer Science", ...],
+     "instructors": ["HABERL, CHARLES", ...],
+     "courses": [{"code": "01:013:111", "title": "BIBLE IN ARAMAIC", "major": 0, "cross_majors": [5, 12],
+                  "instructors": [0], "cross_listed": ["01:563:146", "01:840:123"]}, ...]}
+
+Majors and instructor names are stored once and referenced by position. A course offered
+under several subjects (cross-listed) is one entry under its lowest code, with the other
+codes in `cross_listed` and the majors of the other listings in `cross_majors`. expand()
+turns the document back into the flat records the rest of the pipeline reads (major /
+course_code / course_title / cross_listed / cross_listed_majors). Instructor names are
+only included when asked for, so the recommendation engine never holds them.
+"""
+import json
+import sys
+
+from catalog_index import subject_of
+
+FORMAT = 2
+
+# Record keys that name people; never loaded into the engine
+PRIVATE_KEYS = {'instructor', 'instructors', 'faculty', 'professor', 'lecturer', 'course_instructor'}
+
+
+def is_normalized(data):
+    return isinstance(data, dict) and data.get('format') == FORMAT
+
+
+def public(record):
+    """The record without instructor-like keys."""
+    if not any(k.lower() in PRIVATE_KEYS for k in record):
+        return record
+    return {k: v for k, v in record.items() if k.lower() not in PRIVATE_KEYS}
+
+
+def number(code):
+    parts = str(code or '').split(':')
+    return parts[2] if len(parts) == 3 else ''
+
+
+def cross_list_groups(records):
+    """Lists of record positions that are one course offered under several subjects.
+
+    Records with the same code and title are the same course listed twice. Records are
+    also linked when one names the other's code in `cross_listed` (from the SOC
+    sections, or an entry that was already grouped). Records without that list are also
+    linked when they share a title, a non-empty instructor list and the course number under
+    different subjects (01:013:140 and 01:074:140), which is how the catalog shows sections
+    that meet together; at most one record per subject joins such a group. Levels of one
+    course (07:701:175 / 275 / 375) keep their own entries, and cross-listings under
+    different numbers are only grouped when the SOC lists them.
+    """
+    parent = list(range(len(records)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    by_code = {}
+    by_key = {}
+    together = {}
+    for i, r in enumerate(records):
+        by_code.setdefault(r.get('course_code'), i)
+        union(by_key.setdefault((r.get('course_code'), r.get('course_title')), i), i)
+        names = frozenset(r.get('instructors') or ())
+        if names and not r.get('cross_listed'):
+            together.setdefault((r.get('course_title'), names, number(r.get('course_code'))), []).append(i)
+    for i, r in enumerate(records):
+        for code in r.get('cross_listed') or ():
+            j = by_code.get(code)
+            if j is not None:
+                union(i, j)
+    for ids in together.values():
+        first = {}
+        for i in ids:
+            first.setdefault(subject_of(records[i].get('course_code')), i)
+        ids = list(first.values())
+        for j in ids[1:]:
+            union(ids[0], j)
+
+    groups = {}
+    for i in range(len(records)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def normalize(records, instructors=True):
+    """Build the format-2 document from flat course records (see coursescrapper.project_course).
+
+    With instructors=False no instructor names are written at all.
+    """
+    records = [r for r in records if isinstance(r, dict)]
+    majors, names = {}, {}
+
+    def intern(table, value):
+        return table.setdefault(value, len(table))
+
+    def code(r):
+        return str(r.get('course_code') or '')
+
+    # tables are filled in course order, so normalizing expand()'s output gives the same document
+    groups = sorted((sorted((records[i] for i in ids), key=code) for ids in cross_list_groups(records)),
+                    key=lambda group: code(group[0]))
+    courses = []
+    for group in groups:
+        first = group[0]
+        course = {
+            'code': first.get('course_code') or '',
+            'title': first.get('course_title') or '',
+            'major': intern(majors, first.get('major') or ''),
+        }
+        # the other listings' majors, so the course is still found under each of them
+        others = {}
+        for r in group:
+            for name in [r.get('major'), *(r.get('cross_listed_majors') or ())]:
+                if name:
+                    others[intern(majors, name)] = None
+        others.pop(course['major'], None)
+        if others:
+            course['cross_majors'] = list(others)
+        if instructors:
+            seen = {}
+            for r in group:
+                for name in r.get('instructors') or ():
+                    seen[intern(names, name)] = None
+            if seen:
+                course['instructors'] = list(seen)
+        aliases = {c for r in group for c in [r.get('course_code'), *(r.get('cross_listed') or ())] if c}
+        aliases.discard(course['code'])
+        if aliases:
+            course['cross_listed'] = sorted(aliases)
+        courses.append(course)
+
+    doc = {'format': FORMAT, 'majors': list(majors)}
+    if instructors:
+        doc['instructors'] = list(names)
+    doc['courses'] = courses
+    return doc
+
+
+def dumps(doc):
+    """JSON text with one table entry or course per line: diffable, without indent=2 bloat."""
+    def rows(values):
+        return '[\n' + ',\n'.join(json.dumps(v, ensure_ascii=False) for v in values) + '\n]' if values else '[]'
+    parts = [f'"{key}": {rows(value) if isinstance(value, list) else json.dumps(value)}' for key, value in doc.items()]
+    return '{\n' + ',\n'.join(parts) + '\n}\n'
+
+
+def expand(doc, instructors=False):
+    """Flat course records from a format-2 document. Major names and titles are shared
+    string objects; instructor names are included only with instructors=True."""
+    majors = [sys.intern(m) for m in doc.get('majors') or ()]
+    names = doc.get('instructors') or []
+    out = []
+    for c in doc.get('courses') or ():
+        record = {
+            'major': majors[c['major']] if isinstance(c.get('major'), int) else str(c.get('major') or ''),
+            'course_code': c.get('code') or '',
+            'course_title': sys.intern(c.get('title') or ''),
+        }
+        if c.get('cross_listed'):
+            record['cross_listed'] = list(c['cross_listed'])
+        if c.get('cross_majors'):
+            record['cross_listed_majors'] = [majors[i] for i in c['cross_majors']]
+        if instructors:
+            record['instructors'] = [names[i] for i in c.get('instructors') or ()]
+        out.append(record)
+    return out
+
+
+if __name__ == '__main__':
+    # Rewrite flat catalog JSON files (from before format 2) in the normalized format
+    import os
+    for arg in [a for a in sys.argv[1:] if not a.startswith('--')] or ['rutgers_courses_2025_9_NB.json']:
+        with open(arg, encoding='utf-8') as f:
+            data = json.load(f)
+        if is_normalized(data):
+            print(f"{arg} is already normalized")
+            continue
+        doc = normalize(data, instructors='--no-instructors' not in sys.argv)
+        before = os.path.getsize(arg)
+        with open(arg + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(dumps(doc))
+        os.replace(arg + '.tmp', arg)
+        print(f"✅ {arg}: {len(data)} records -> {len(doc['courses'])} courses, {len(doc['majors'])} majors, "
+              f"{len(doc.get('instructors', []))} instructors ({before} -> {os.path.getsize(arg)} bytes)")
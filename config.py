@@ -0,0 +1,59 @@
+import os
+
+
+def env_flag(name, default="0"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+class Config:
+    """Settings for app.py, read from the environment. Loaded with app.config.from_object();
+    set APP_CONFIG to the import path of a subclass to override them in code."""
+
+    DEBUG = env_flag("FLASK_DEBUG")
+
+    # Each upload gets its own directory under here (shared by all worker processes)
+    UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "jobs")
+    # How many analyses may call Gemini at once, and how many may be waiting (per worker process)
+    MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+    MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "64"))
+    # Threads that start text extraction and step 1 at upload time for uploads that get a
+    # running slot at once; two per running job (text and step 1 run side by side), so
+    # prefetching never caps it
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", str(2 * MAX_CONCURRENT_JOBS)))
+
+    # Uploads larger than this are refused with 413 while they are still being received
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+    # Up to this size an upload stays in memory and is handed to its job as bytes; larger
+    # ones are spooled to a temp file while receiving and then written to the job directory
+    UPLOAD_MEMORY_BYTES = int(os.getenv("UPLOAD_MEMORY_BYTES", str(1024 * 1024)))
+
+    # Model responses are cached by resume hash so re-submits skip the API
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "cache/responses.sqlite3")
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Catalogs: every rutgers_courses_<year>_<term>_<campus>.json in CATALOG_DIR, checked
+    # for changes every CATALOG_RELOAD_SECONDS (0 disables reloading); DEFAULT_CATALOG is used
+    # when a request does not choose one
+    CATALOG_DIR = os.getenv("CATALOG_DIR", ".")
+    DEFAULT_CATALOG = os.getenv("DEFAULT_CATALOG", "rutgers_courses_2025_9_NB.json")
+    CATALOG_RELOAD_SECONDS = float(os.getenv("CATALOG_RELOAD_SECONDS", "60"))
+
+    # GEMINI_RPM / GEMINI_TPM (read by gemini_client.py) are the quota of the whole deployment:
+    # each process enforces its own limits, so under gunicorn every worker gets 1/workers of them
+    # (post_fork in gunicorn.conf.py). Separate deployments or batch.py runs on the same API key
+    # need their own split.
+
+    # One schema-constrained Gemini call per resume instead of major prediction + recommendation
+    SINGLE_CALL = env_flag("SINGLE_CALL")
+
+    # Front-end files: only these extensions are served from STATIC_ROOT, so the catalog,
+    # .env, code and job directories never are
+    STATIC_ROOT = os.getenv("STATIC_ROOT", ".")
+    STATIC_EXTENSIONS = frozenset({".html", ".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".woff2"})
+    STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))
+
+    # Per-process metrics are summed across workers through snapshot files here ('' to disable)
+    METRICS_DIR = os.getenv("METRICS_DIR", "cache/metrics")
+    # Always include the per-request stage trace in /jobs/<id>/result (otherwise only with ?trace=1)
+    INCLUDE_TRACE = env_flag("INCLUDE_TRACE")
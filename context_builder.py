@@ -0,0 +1,78 @@
+import math
+import os
+import re
+
+from catalog_index import tokenize
+from gemini_client import CHARS_PER_TOKEN
+
+# Step-2 course list budget; a 'code|title' line costs about 8 tokens
+CONTEXT_TOKENS = int(os.getenv("CATALOG_CONTEXT_TOKENS", "1200"))
+
+
+def course_line(course):
+    code = course.get('course_code') or course.get('code') or ''
+    title = course.get('course_title') or course.get('title') or course.get('name') or ''
+    return f"{code}|{' '.join(str(title).split())}" if (code or title) else ''
+
+
+def title_key(course):
+    """The title in lower case with punctuation and spacing removed, for spotting repeats."""
+    if not isinstance(course, dict):
+        return ''
+    title = course.get('course_title') or course.get('title') or course.get('name') or ''
+    return ' '.join(re.findall(r"[a-z0-9]+", str(title).lower()))
+
+
+class ContextBuilder:
+    """Ranks candidate courses by relevance to a resume and packs them into a token budget.
+
+    Built once per catalog. Relevance is the IDF-weighted overlap between a course title's
+    words and the resume text, so rare, specific words ('compilers') count more than common
+    ones ('introduction'). Courses are encoded as 'code|title' lines; a title that was
+    already packed (a cross-listing under a different number) is skipped. The whole title
+    counts, numerals included, so 'CALCULUS II' is kept after 'CALCULUS I'.
+    """
+
+    def __init__(self, index, budget=CONTEXT_TOKENS):
+        self.index = index
+        self.budget = budget
+        self.title_tokens = [set(tokenize(c.get('course_title') or c.get('title') or '')) if isinstance(c, dict) else set()
+                             for c in index.courses]
+        self.title_keys = [title_key(c) for c in index.courses]
+        n = max(len(index.courses), 1)
+        self.idf = {tok: math.log(n / len(ids)) for tok, ids in index.postings.items()}
+
+    def rank(self, course_ids, resume_text):
+        """Course IDs ordered by relevance to the resume (ties keep catalog order)."""
+        resume = set(tokenize(resume_text))
+        if not resume:
+            return list(course_ids)
+        idf = self.idf
+
+        def score(i):
+            return sum(idf.get(t, 0.0) for t in self.title_tokens[i] & resume)
+
+        return sorted(course_ids, key=lambda i: (-score(i), i))
+
+    def pack(self, course_ids, budget=None):
+        """Encode courses in the given order until the token budget is spent. Returns (text, course_ids)."""
+        budget_chars = (budget or self.budget) * CHARS_PER_TOKEN
+        lines, packed, seen = [], [], set()
+        size = 0
+        for i in course_ids:
+            course = self.index.courses[i]
+            line = course_line(course)
+            key = self.title_keys[i] or line
+            if not line or key in seen:
+                continue
+            if size + len(line) + 1 > budget_chars:
+                break
+            seen.add(key)
+            lines.append(line)
+            packed.append(i)
+            size += len(line) + 1
+        return '\n'.join(lines), packed
+
+    def build(self, course_ids, resume_text, budget=None):
+        """rank() then pack(). Returns (text, course_ids)."""
+        return self.pack(self.rank(course_ids, resume_text), budget)
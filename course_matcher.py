@@ -0,0 +1,158 @@
+import heapq
+import math
+import re
+from collections import Counter
+from itertools import chain
+
+# Full ('01:198:111') or short ('198:111') Rutgers course codes inside free text
+CODE_RE = re.compile(r"\b(?:(\d{2}):)?(\d{3}):(\d{3})\b")
+
+STOP_WORDS = {'and', 'of', 'the', 'to', 'for', 'in', 'on', 'with', 'a', 'an'}
+
+# Catalog abbreviations that are not prefixes or subsequences of the words they stand for
+EXPANSIONS = {
+    'cs': ['computer', 'science'],
+    'ai': ['artificial', 'intelligence'],
+    'ml': ['machine', 'learning'],
+    'ds': ['data', 'structures'],
+    'db': ['database'],
+    'os': ['operating', 'systems'],
+}
+
+
+def normalize(text):
+    return ' '.join(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def words(text):
+    # 'A I' is spelled with a space in several titles
+    norm = re.sub(r"\ba i\b", 'ai', normalize(text))
+    out = []
+    for w in norm.split():
+        if w in STOP_WORDS:
+            continue
+        out.extend(EXPANSIONS.get(w, [w]))
+    return out
+
+
+def is_subsequence(short, long):
+    it = iter(long)
+    return all(ch in it for ch in short)
+
+
+def word_match(title_word, word):
+    """True when a catalog title word is `word` or looks like an abbreviation of it.
+
+    Only the catalog side is abbreviated ('strct' for 'structures'): a recommendation word
+    is never taken as an abbreviation of a longer title word, so 'psychology' does not
+    match 'psychopathology'.
+    """
+    if title_word == word:
+        return True
+    if title_word.isdigit() or word.isdigit() or len(title_word) < 3 or len(word) < 3:
+        return False
+    return word.startswith(title_word) or (
+        len(title_word) < len(word) and title_word[0] == word[0] and is_subsequence(title_word, word))
+
+
+def prefix_key(word):
+    return word[:3]
+
+
+class CourseMatcher:
+    """Matches free-text course recommendations to catalog records, built once per catalog.
+
+    Lookups try, in order: a course code in the text, an exact normalized title, then a
+    fuzzy match. Fuzzy candidates come from an index of 3-letter word prefixes and only the
+    best `max_candidates` of them are scored, word by word, with abbreviation-aware matching
+    (catalog titles are truncated to 20 characters, e.g. 'INTR DISCRET STRCT I').
+
+    Title words are weighted by how rare they are in the catalog, so a title word the
+    recommendation does not mention costs more when it is specific ('CHILD', 'ASTRO') than
+    when it is generic ('INTRO', 'RESEARCH').
+    """
+
+    def __init__(self, courses, cutoff=0.7, max_candidates=25):
+        self.courses = courses
+        self.cutoff = cutoff
+        self.max_candidates = max_candidates
+        self.by_code = {}
+        self.by_short_code = {}
+        self.by_title = {}
+        self.titles = []
+        self.title_words = []
+        self.prefixes = {}
+        for course_id, c in enumerate(courses):
+            if not isinstance(c, dict):
+                continue
+            # a cross-listed course answers to each of its codes
+            for code in [str(c.get('course_code') or c.get('code') or ''), *(c.get('cross_listed') or ())]:
+                m = CODE_RE.search(code)
+                if m:
+                    self.by_code.setdefault(m.group(0), course_id)
+                    self.by_short_code.setdefault(f"{m.group(2)}:{m.group(3)}", course_id)
+            title = normalize(c.get('course_title') or c.get('title') or c.get('name') or '')
+            if not title or title in self.by_title:
+                continue
+            self.by_title[title] = course_id
+            title_id = len(self.titles)
+            self.titles.append(title)
+            tw = words(title)
+            self.title_words.append(tw)
+            for key in {prefix_key(w) for w in tw}:
+                self.prefixes.setdefault(key, []).append(title_id)
+        df = Counter(chain.from_iterable(set(tw) for tw in self.title_words))
+        self.weights = {w: 1 + math.log(len(self.titles) / n) for w, n in df.items()}
+
+    def match_code(self, text):
+        for m in CODE_RE.finditer(str(text)):
+            course_id = self.by_code.get(m.group(0)) if m.group(1) else None
+            if course_id is None:
+                course_id = self.by_short_code.get(f"{m.group(2)}:{m.group(3)}")
+            if course_id is not None:
+                return self.courses[course_id]
+        return None
+
+    def score(self, rec_words, title_words):
+        """F0.5 of the words on each side that have a counterpart on the other side.
+
+        Precision (the share of the title, by weight, that the recommendation covers) counts
+        twice as much as recall: a title with extra specific words is a different course.
+        """
+        if not rec_words or not title_words:
+            return 0.0
+        hit = sum(self.weights.get(t, 1.0) for t in title_words if any(word_match(t, r) for r in rec_words))
+        if not hit:
+            return 0.0
+        rec_hits = sum(1 for r in rec_words if any(word_match(t, r) for t in title_words))
+        precision = hit / sum(self.weights.get(t, 1.0) for t in title_words)
+        recall = rec_hits / len(rec_words)
+        return 1.25 * precision * recall / (0.25 * precision + recall)
+
+    def match(self, text):
+        """Return the best catalog record for a recommendation, or None."""
+        course = self.match_code(text)
+        if course:
+            return course
+        norm = normalize(CODE_RE.sub(' ', str(text)))
+        if not norm:
+            return None
+        course_id = self.by_title.get(norm)
+        if course_id is not None:
+            return self.courses[course_id]
+
+        rec_words = words(norm)
+        shared = Counter(chain.from_iterable(self.prefixes.get(key, ()) for key in {prefix_key(w) for w in rec_words}))
+        if not shared:
+            return None
+
+        top = heapq.nlargest(self.max_candidates, shared,
+                             key=lambda t: (shared[t], -len(self.title_words[t])))
+        best, best_score = None, self.cutoff
+        for title_id in top:
+            s = self.score(rec_words, self.title_words[title_id])
+            if s > best_score or (s == best_score and best is None):
+                best, best_score = title_id, s
+                if s == 1.0:
+                    break
+        return None if best is None else self.courses[self.by_title[self.titles[best]]]
@@ -0,0 +1,117 @@
+import os
+import pathlib
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # optional; without it step-2 candidates come from the major lookup only
+    np = None
+
+from catalog_index import tokenize
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+# Weight of a `major` word relative to a title word in a course's document
+MAJOR_WEIGHT = 0.5
+# Score multiplier for courses the predicted major's index lookup also returned
+MAJOR_BOOST = 1.5
+
+RETRIEVAL_CACHE_DIR = os.getenv("RETRIEVAL_CACHE_DIR", "cache")
+
+
+class CourseRetriever:
+    """BM25 retrieval over course titles and majors, scored with NumPy.
+
+    The catalog is stored as a sparse term-weight matrix in coordinate form (row = course ID,
+    col = vocabulary ID, weight = BM25 term weight). Scoring a resume is one gather and one
+    bincount over the non-zeros, well under a millisecond for the whole catalog. The arrays depend only
+    on the catalog, so they are saved per catalog version and loaded on the next start.
+    """
+
+    def __init__(self, vocab, rows, cols, weights, size):
+        self.vocab = {tok: i for i, tok in enumerate(vocab)}
+        self.rows = rows
+        self.cols = cols
+        self.weights = weights
+        self.size = size
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    @classmethod
+    def build(cls, courses):
+        docs = []
+        for c in courses:
+            tf = Counter()
+            if isinstance(c, dict):
+                tf.update(tokenize(c.get('course_title') or c.get('title') or ''))
+                for tok in tokenize(c.get('major') or ''):
+                    tf[tok] += MAJOR_WEIGHT
+            docs.append(tf)
+        vocab = sorted({tok for tf in docs for tok in tf})
+        ids = {tok: i for i, tok in enumerate(vocab)}
+
+        rows, cols, tfs, lengths = [], [], [], []
+        for row, tf in enumerate(docs):
+            lengths.append(sum(tf.values()))
+            for tok, n in tf.items():
+                rows.append(row)
+                cols.append(ids[tok])
+                tfs.append(n)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        lengths = np.asarray(lengths, dtype=np.float32)
+
+        n_docs = len(docs)
+        df = np.bincount(cols, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        norm = K1 * (1 - B + B * lengths / max(float(lengths.mean()) if n_docs else 1.0, 1e-6))
+        weights = idf[cols] * tfs * (K1 + 1) / (tfs + norm[rows])
+        return cls(vocab, rows, cols, weights.astype(np.float32), n_docs)
+
+    @classmethod
+    def load_or_build(cls, courses, version, cache_dir=RETRIEVAL_CACHE_DIR):
+        """Load the matrix saved for this catalog version, or build and save it."""
+        path = pathlib.Path(cache_dir) / f"retrieval-{version}.npz"
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(data['vocab'].tolist(), data['rows'], data['cols'], data['weights'], int(data['size']))
+        except (OSError, KeyError, ValueError):
+            pass
+        retriever = cls.build(courses)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+            np.savez(tmp, vocab=np.asarray(sorted(retriever.vocab, key=retriever.vocab.get)),
+                     rows=retriever.rows, cols=retriever.cols, weights=retriever.weights, size=retriever.size)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: could not save retrieval index: {e}")
+        return retriever
+
+    def query_vector(self, text):
+        q = np.zeros(len(self.vocab), dtype=np.float32)
+        for tok, n in Counter(tokenize(text)).items():
+            i = self.vocab.get(tok)
+            if i is not None:
+                # dampen words the resume repeats
+                q[i] = 1.0 + np.log(n)
+        return q
+
+    def scores(self, text):
+        """BM25 score of every course against the text, as an array indexed by course ID."""
+        q = self.query_vector(text)
+        return np.bincount(self.rows, weights=self.weights * q[self.cols], minlength=self.size)
+
+    def search(self, text, limit=None, boost=()):
+        """Course IDs with a positive score, best first. IDs in `boost` get MAJOR_BOOST x their score."""
+        scores = self.scores(text)
+        if len(boost):
+            scores[np.asarray(boost, dtype=np.int64)] *= MAJOR_BOOST
+        hits = np.flatnonzero(scores > 0)
+        # stable sort keeps catalog order between equal scores
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        return order[:limit].tolist() if limit else order.tolist()
@@ -1,49 +1,315 @@
 import requests
 import json
+import hashlib
+import os
+import argparse
+import codecs
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def save_full_course_info(year=2025, term=9, campus="NB", filename=None):
-    """Fetch Rutgers course info and save major name, full code, title, and instructors."""
-    url = "https://classes.rutgers.edu/soc/api/courses.json"
+from catalog_binary import write_catalog
+from catalog_tables import normalize, expand, dumps, is_normalized
+
+SOC_URL = "https://classes.rutgers.edu/soc/api/courses.json"
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array from an iterable of byte chunks.
+
+    Only the current element and one chunk are buffered, so parsing needs memory for the largest
+    element rather than the whole document (callers decide what they keep of each element;
+    the scraper keeps a projected record per course, see save_full_course_info).
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    started = False
+    exhausted = False
+
+    def more():
+        nonlocal buf, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + text.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buf):
+            if exhausted:
+                raise ValueError("Unexpected end of JSON array")
+            more()
+            continue
+        ch = buf[pos]
+        if not started:
+            if ch != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if ch == "]":
+            return
+        if ch == ",":
+            pos += 1
+            continue
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            more()
+            continue
+        # a number can stop at a chunk boundary ("-1." then "5"), so a value only counts once
+        # the ',' or ']' after it has arrived
+        after = end
+        while after < len(buf) and buf[after] in _WHITESPACE:
+            after += 1
+        if after == len(buf) or buf[after] not in ",]":
+            if exhausted:
+                raise ValueError("Expected ',' or ']' after a JSON array element")
+            more()
+            continue
+        pos = after
+        yield value
+
+
+def iter_courses(res):
+    """Stream a courses.json response, projecting each course as soon as it has been parsed."""
+    for c in iter_json_array(res.iter_content(chunk_size=CHUNK_SIZE)):
+        yield project_course(c)
+
+
+def project_course(c):
+    """Reduce one SOC API course to the fields we keep."""
+    major_name = c.get("subjectDescription", "Unknown Major")
+    full_code = c.get("courseString", "N/A")  # e.g. "01:198:111"
+    course_title = c.get("title", "Untitled Course")
+
+    # Collect instructor names from all sections (first-seen order, so reruns are stable)
+    instructors = {}
+    cross_listed = set()
+    for section in c.get("sections", []):
+        for prof in section.get("instructors", []):
+            instructors[prof.get("name", "Unknown Instructor")] = None
+        # the same section offered under other subjects
+        for other in section.get("crossListedSections") or []:
+            parts = (other.get("offeringUnitCode"), other.get("subjectCode"), other.get("courseNumber"))
+            if all(parts):
+                cross_listed.add(":".join(parts))
+    cross_listed.discard(full_code)
+
+    course = {
+        "major": major_name,
+        "course_code": full_code,
+        "course_title": course_title,
+        "instructors": list(instructors)
+    }
+    if cross_listed:
+        course["cross_listed"] = sorted(cross_listed)
+    return course
+
+
+def catalog_filename(year, term, campus, filename=None):
+    filename = filename or f"rutgers_courses_{year}_{term}_{campus}.json"
+    if not filename.endswith(".json"):
+        filename += ".json"
+    return filename
+
+
+def write_courses(courses, filename, binary=False, instructors=True):
+    """Write the normalized catalog JSON (see catalog_tables.py) atomically, plus the compact
+    .rucat copy when binary=True. With instructors=False no instructor names are saved."""
+    doc = normalize(courses, instructors)
+    payload = dumps(doc)
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+    os.replace(tmp, filename)
+
+    if binary:
+        binary_name = filename[:-len(".json")] + ".rucat"
+        write_catalog(expand(doc), binary_name, hashlib.sha256(payload.encode("utf-8")).digest())
+        print(f"✅ Saved compact catalog to {binary_name}")
+    return doc
+
+
+def save_full_course_info(year=2025, term=9, campus="NB", filename=None, binary=False, url=SOC_URL, instructors=True):
+    """Fetch Rutgers course info and save major name, full code, title, and instructors.
+
+    The response is parsed as it streams in (iter_json_array) and each course is projected
+    as soon as it has been parsed, so the raw campus dump, with its sections and meeting
+    times, is never held. Memory is not bounded by one course, though: the normalized
+    format replaced writing each course as it arrives. A listing's cross-listings can appear
+    anywhere in the response, so every projected listing is collected (about 2.7 MB for the
+    4,400 New Brunswick listings, instructors included) before they are grouped, and the
+    normalized document written from them grows with the catalog as well. Peak memory is
+    therefore proportional to the number of listings.
+    With binary=True a compact .rucat copy (see catalog_binary.py) is written next to the JSON.
+    """
     params = {"year": year, "term": term, "campus": campus}
-    
+
     try:
-        res = requests.get(url, params=params)
-        res.raise_for_status()
-        data = res.json()
-
-        courses = []
-        for c in data:
-            major_name = c.get("subjectDescription", "Unknown Major")
-            full_code = c.get("courseString", "N/A")  # e.g. "01:198:111"
-            course_title = c.get("title", "Untitled Course")
-            
-            # Collect instructor names from all sections
-            instructors = set()
-            for section in c.get("sections", []):
-                for prof in section.get("instructors", []):
-                    instructors.add(prof.get("name", "Unknown Instructor"))
-            
-            courses.append({
-                "major": major_name,
-                "course_code": full_code,
-                "course_title": course_title,
-                "instructors": list(instructors)
-            })
-
-        filename = filename or f"rutgers_courses_{year}_{term}_{campus}.json"
-        if not filename.endswith(".json"):
-            filename += ".json"
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(courses, f, indent=2, ensure_ascii=False)
-
-        print(f"✅ Saved {len(courses)} courses to {filename}")
-    
+        filename = catalog_filename(year, term, campus, filename)
+        with requests.get(url, params=params, stream=True) as res:
+            res.raise_for_status()
+            courses = list(iter_courses(res))
+        doc = write_courses(courses, filename, binary, instructors)
+
+        print(f"✅ Saved {len(doc['courses'])} courses ({len(courses)} listings) to {filename}")
+
     except requests.RequestException as err:
         print("❌ Network error:", err)
     except Exception as e:
         print("❌ Error saving data:", e)
 
 
+def make_session(pool_size=16, retries=3):
+    """A pooled session that retries connection errors, 429 and 5xx with backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def course_key(course):
+    # course_code alone is not unique (topics courses share a code), so include the title
+    return (course.get("course_code"), course.get("course_title"))
+
+
+def diff_courses(old, new):
+    """Compare two catalogs. Returns (added, changed, removed) lists of records."""
+    old_by_key = {course_key(c): c for c in old}
+    new_keys = set()
+    added, changed = [], []
+    for c in new:
+        key = course_key(c)
+        new_keys.add(key)
+        prev = old_by_key.get(key)
+        if prev is None:
+            added.append(c)
+        elif (prev.get("major") != c.get("major") or prev.get("cross_listed") != c.get("cross_listed")
+              or prev.get("cross_listed_majors") != c.get("cross_listed_majors")
+              or sorted(prev.get("instructors") or []) != sorted(c.get("instructors") or [])):
+            changed.append(c)
+    removed = [c for key, c in old_by_key.items() if key not in new_keys]
+    return added, changed, removed
+
+
+def load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def refresh_course_info(session, year, term, campus, filename=None, binary=False, url=SOC_URL, timeout=60,
+                        instructors=True):
+    """Conditionally re-fetch one (year, term, campus) catalog and rewrite it only if courses changed.
+
+    The ETag/Last-Modified of the last fetch is kept in <catalog>.meta.json and sent back as
+    If-None-Match/If-Modified-Since, so an unchanged catalog costs one 304. Unchanged records
+    keep their stored form, so instructor order churn does not count as a change. Both sides
+    are compared as normalized courses (cross-listings grouped). Returns a summary dict.
+    """
+    filename = catalog_filename(year, term, campus, filename)
+    meta_path = filename + ".meta.json"
+    meta = load_json(meta_path, {})
+    old = load_json(filename, None)
+    if is_normalized(old):
+        old = expand(old, instructors=True)
+
+    headers = {}
+    if old is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    summary = {"year": year, "term": term, "campus": campus, "filename": filename}
+    with session.get(url, params={"year": year, "term": term, "campus": campus}, headers=headers, timeout=timeout, stream=True) as res:
+        if res.status_code == 304:
+            summary.update(status="not modified", added=0, changed=0, removed=0)
+            return summary
+        res.raise_for_status()
+        new = expand(normalize(iter_courses(res), instructors), instructors=True)
+        res_headers = res.headers
+    added, changed, removed = diff_courses(old or [], new)
+    summary.update(added=len(added), changed=len(changed), removed=len(removed))
+
+    if old is None or added or changed or removed:
+        changed_keys = {course_key(c) for c in changed}
+        old_by_key = {course_key(c): c for c in old or []}
+        merged = [c if course_key(c) in changed_keys else old_by_key.get(course_key(c), c) for c in new]
+        write_courses(merged, filename, binary, instructors)
+        summary["status"] = "updated"
+    else:
+        summary["status"] = "unchanged"
+
+    meta = {"etag": res_headers.get("ETag"), "last_modified": res_headers.get("Last-Modified")}
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return summary
+
+
+def refresh_all(years, terms, campuses, binary=False, url=SOC_URL, workers=8, instructors=True):
+    """Refresh every (year, term, campus) combination concurrently over one pooled session."""
+    combos = list(itertools.product(years, terms, campuses))
+    session = make_session(pool_size=max(workers, 1))
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(refresh_course_info, session, y, t, c, binary=binary, url=url, instructors=instructors): (y, t, c)
+                   for y, t, c in combos}
+        for fut in as_completed(futures):
+            y, t, c = futures[fut]
+            try:
+                s = fut.result()
+                print(f"✅ {y}/{t}/{c}: {s['status']} (+{s['added']} ~{s['changed']} -{s['removed']}) -> {s['filename']}")
+                results.append(s)
+            except requests.RequestException as err:
+                print(f"❌ {y}/{t}/{c}: network error:", err)
+                results.append({"year": y, "term": t, "campus": c, "status": "error", "error": str(err)})
+            except Exception as e:
+                print(f"❌ {y}/{t}/{c}: error saving data:", e)
+                results.append({"year": y, "term": t, "campus": c, "status": "error", "error": str(e)})
+    return results
+
+
 if __name__ == "__main__":
-    save_full_course_info()
+    parser = argparse.ArgumentParser(description="Scrape the Rutgers SOC course catalog.")
+    parser.add_argument("--refresh", action="store_true", help="incrementally refresh many term/campus catalogs in parallel")
+    parser.add_argument("--years", type=int, nargs="+", default=[2025])
+    parser.add_argument("--terms", type=int, nargs="+", default=[9])
+    parser.add_argument("--campuses", nargs="+", default=["NB"])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--binary", action="store_true", help="also write the compact .rucat catalog (for tools; the server loads the JSON)")
+    parser.add_argument("--url", default=SOC_URL, help="SOC courses.json endpoint (e.g. a local stub server)")
+    parser.add_argument("--no-instructors", action="store_true", help="do not save instructor names at all")
+    args = parser.parse_args()
+
+    instructors = not args.no_instructors
+    if args.refresh:
+        refresh_all(args.years, args.terms, args.campuses, binary=args.binary, url=args.url, workers=args.workers,
+                    instructors=instructors)
+    else:
+        save_full_course_info(args.years[0], args.terms[0], args.campuses[0], binary=args.binary, url=args.url,
+                              instructors=instructors)
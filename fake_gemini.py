@@ -0,0 +1,133 @@
+"""Deterministic stand-in for genai.Client, for benchmarks and offline runs.
+
+    engine = RecommendationEngine(client=FakeClient(latency=0.5, jitter=0.1))
+
+It answers the three kinds of requests the pipeline makes: the step-1 major prediction, the
+step-2 markdown (plain or streamed) and the single-call JSON. Each call sleeps for `latency`
+seconds (plus uniform jitter from a seeded generator) and reports token usage.
+"""
+import json
+import random
+import threading
+import time
+
+MAJOR = "computer"
+
+STEP2_MARKDOWN = """# Resume Analysis
+
+## Summary
+A computer science student with internship experience in Python, data analysis and web development.
+
+## Recommended Courses
+1. **Data Structures** - core foundation for software engineering roles
+2. **Intro to Artificial Intelligence** - builds on the machine learning projects
+3. **Software Methodology** - team software development practices
+4. **Database Systems** - backs the data analysis experience
+5. **Machine Learning** - next step after the AI course
+6. **Linear Algebra** - required mathematics for machine learning
+
+## Course Roadmap
+### Short term (6-12 months)
+- Data Structures
+- Software Methodology
+### Long term (1-3 years)
+- Machine Learning
+- Database Systems
+
+## Career Paths
+- Software Engineer
+- Machine Learning Engineer
+
+## Key Skills
+- System design
+- Cloud platforms
+
+```json
+{"recommended_courses": ["01:198:112", "01:198:440", "01:198:213"], "short_term": ["01:198:112"], "long_term": ["01:198:461"]}
+```
+"""
+
+STRUCTURED = {
+    "major": MAJOR,
+    "recommended_courses": [
+        {"code": "01:198:112", "title": "Data Structures"},
+        {"code": "01:198:440", "title": "Intro to Artificial Intelligence"},
+        {"code": "", "title": "Software Methodology"},
+    ],
+    "short_term": ["Data Structures"],
+    "long_term": ["Machine Learning"],
+    "markdown": STEP2_MARKDOWN.split("```json")[0],
+}
+
+
+class Usage:
+    def __init__(self, prompt, output):
+        self.prompt_token_count = prompt
+        self.candidates_token_count = output
+        self.total_token_count = prompt + output
+
+
+class Response:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def prompt_text(contents):
+    return ' '.join(c for c in (contents if isinstance(contents, (list, tuple)) else [contents]) if isinstance(c, str))
+
+
+class FakeModels:
+    def __init__(self, latency, jitter, seed, chunk_lines, responses):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_lines = chunk_lines
+        self.responses = responses
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def _sleep(self, share=1.0):
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, delay) * share)
+
+    def _answer(self, contents, config):
+        schema = config.get('response_schema') if isinstance(config, dict) else getattr(config, 'response_schema', None)
+        if schema is not None:
+            return self.responses['structured']
+        if 'SINGLE WORD' in prompt_text(contents):
+            return self.responses['major']
+        return self.responses['recommendation']
+
+    def generate_content(self, model, contents, config=None):
+        self._count()
+        self._sleep()
+        text = self._answer(contents, config)
+        return Response(text, Usage(1500, len(text) // 4))
+
+    def generate_content_stream(self, model, contents, config=None):
+        self._count()
+        text = self._answer(contents, config)
+        lines = text.splitlines(keepends=True)
+        chunks = [''.join(lines[i:i + self.chunk_lines]) for i in range(0, len(lines), self.chunk_lines)] or ['']
+        # the latency is spread over the chunks, like a model writing its answer
+        for i, chunk in enumerate(chunks):
+            self._sleep(1.0 / len(chunks))
+            yield Response(chunk, Usage(1500, len(text) // 4) if i == len(chunks) - 1 else None)
+
+
+class FakeClient:
+    """Drop-in for genai.Client(api_key=...): only `.models` is used by the pipeline."""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0, chunk_lines=4, responses=None):
+        self.models = FakeModels(latency, jitter, seed, chunk_lines, {
+            'major': MAJOR,
+            'recommendation': STEP2_MARKDOWN,
+            'structured': json.dumps(STRUCTURED),
+            **(responses or {}),
+        })
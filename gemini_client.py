@@ -0,0 +1,288 @@
+import os
+import random
+import threading
+import time
+
+from google.genai import types
+
+from metrics import GEMINI_CALLS, GEMINI_RETRIES, GEMINI_TOKENS, count
+
+# Defaults match the gemini-2.5-flash paid tier 1 quota; override per deployment. The quota is
+# per project, so processes sharing it must each take a part (GeminiClient.share)
+DEFAULT_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+DEFAULT_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+DEFAULT_DEADLINE = float(os.getenv("GEMINI_DEADLINE_SECONDS", "120"))
+
+# Rough input token cost used to reserve quota before the call; corrected from usage_metadata after
+PDF_TOKENS = 1500
+CHARS_PER_TOKEN = 4
+
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+TIMEOUT = "timeout"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call cannot finish (including waits and retries) before its deadline."""
+
+
+def classify(exc):
+    """Return RATE_LIMIT, SERVER or TIMEOUT for retryable errors, None for everything else."""
+    code = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+    msg = str(exc).upper()
+    if code == 429 or 'RESOURCE_EXHAUSTED' in msg or '429' in msg:
+        return RATE_LIMIT
+    if (isinstance(code, int) and code >= 500) or any(s in msg for s in ('INTERNAL', 'UNAVAILABLE', ' 500', ' 503')):
+        return SERVER
+    if isinstance(exc, TimeoutError) or 'TIMEOUT' in type(exc).__name__.upper() or 'DEADLINE_EXCEEDED' in msg or 'TIMED OUT' in msg:
+        return TIMEOUT
+    return None
+
+
+def estimate_tokens(contents):
+    total = 0
+    for part in contents if isinstance(contents, (list, tuple)) else [contents]:
+        if isinstance(part, str):
+            total += len(part) // CHARS_PER_TOKEN
+            continue
+        blob = getattr(part, 'inline_data', None)
+        if blob is not None and getattr(blob, 'data', None) is not None:
+            if (blob.mime_type or '').startswith('text/'):
+                total += len(blob.data) // CHARS_PER_TOKEN
+            else:
+                total += PDF_TOKENS
+    return max(total, 1)
+
+
+class TokenBucket:
+    """Thread-safe bucket refilled continuously at `per_minute`; capacity is one minute's worth.
+
+    The refill rate adapts: throttle() cuts it after a 429 and recover() creeps it back up.
+    """
+
+    def __init__(self, per_minute):
+        self.limit = float(per_minute)
+        self.rate = self.limit / 60.0
+        self.tokens = self.limit
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount, deadline=None):
+        """Take `amount` tokens, waiting as needed. Raises DeadlineExceededError if that would pass the deadline."""
+        amount = min(amount, self.limit)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise DeadlineExceededError("Rate limit wait would exceed the call deadline")
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount):
+        """Debit (positive) or refund (negative) tokens after the real cost is known."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.limit, self.tokens - amount)
+
+    def throttle(self, factor=0.5):
+        with self.lock:
+            self.rate = max(self.limit / 60.0 * 0.05, self.rate * factor)
+            self.tokens = min(self.tokens, 0.0)
+
+    def recover(self, factor=1.05):
+        with self.lock:
+            self.rate = min(self.limit / 60.0, self.rate * factor)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive retryable failures; after `reset_after` seconds one
+    trial call is let through (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, threshold=5, reset_after=30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_after or self.trial_in_flight:
+                raise CircuitOpenError("Gemini API circuit is open after repeated failures; try again shortly.")
+            self.trial_in_flight = True
+
+    def release(self):
+        """Give back a half-open trial that never reached the API, leaving the state as it was."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+
+def with_timeout(config, seconds):
+    """Return a GenerateContentConfig whose HTTP timeout is `seconds` (config may be None, a dict or a model)."""
+    http_options = types.HttpOptions(timeout=max(1, int(seconds * 1000)))
+    if config is None:
+        return types.GenerateContentConfig(http_options=http_options)
+    if isinstance(config, dict):
+        return {**config, 'http_options': http_options}
+    return config.model_copy(update={'http_options': http_options})
+
+
+class GeminiClient:
+    """Shared wrapper around genai.Client used for every model call.
+
+    Calls wait on request- and token-per-minute buckets, retry 429/5xx/timeouts with jittered
+    exponential backoff, respect a per-call deadline and go through a circuit breaker. It exposes
+    `.models.generate_content(...)` / `.models.generate_content_stream(...)` like genai.Client.
+    """
+
+    def __init__(self, client, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_attempts=4, base_delay=1.0,
+                 max_delay=30.0, deadline=DEFAULT_DEADLINE, breaker=None):
+        self.client = client
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+
+    @property
+    def models(self):
+        return self
+
+    def share(self, fraction):
+        """Limit this client to `fraction` of its quota, for one of several processes that
+        split a project's quota between them (see post_fork in gunicorn.conf.py)."""
+        self.requests = TokenBucket(self.requests.limit * fraction)
+        self.tokens = TokenBucket(self.tokens.limit * fraction)
+
+    def _backoff(self, attempt, kind, end):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if kind == RATE_LIMIT:
+            self.requests.throttle()
+            delay = max(delay, self.base_delay)
+        if time.monotonic() + delay >= end:
+            return False
+        print(f"Gemini call failed ({kind}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+        return True
+
+    def _reserve(self, contents, end):
+        estimate = estimate_tokens(contents)
+        self.requests.acquire(1, end)
+        self.tokens.acquire(estimate, end)
+        return estimate
+
+    def _settle(self, response, estimate):
+        usage = getattr(response, 'usage_metadata', None)
+        actual = getattr(usage, 'total_token_count', None) if usage is not None else None
+        if actual:
+            self.tokens.adjust(actual - estimate)
+        for kind, field in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count')):
+            n = getattr(usage, field, None) if usage is not None else None
+            if n:
+                GEMINI_TOKENS.inc(n, kind=kind)
+                count(f'{kind}_tokens', n)
+        self.requests.recover()
+
+    def _call(self, start_call, contents, deadline):
+        end = time.monotonic() + (deadline or self.deadline)
+        last = None
+        for attempt in range(self.max_attempts):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                GEMINI_CALLS.inc(outcome='circuit_open')
+                raise
+            try:
+                estimate = self._reserve(contents, end)
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceededError("Gemini call deadline exceeded")
+            except DeadlineExceededError:
+                # no request was sent, so a half-open trial must not stay taken
+                self.breaker.release()
+                GEMINI_CALLS.inc(outcome='deadline')
+                raise
+            try:
+                result = start_call(remaining)
+            except Exception as e:
+                kind = classify(e)
+                if kind is None:
+                    # the API answered (e.g. a 400), so it is not a reason to open the circuit
+                    self.breaker.record_success()
+                    GEMINI_CALLS.inc(outcome='error')
+                    raise
+                last = e
+                self.breaker.record_failure()
+                self.retries += 1
+                GEMINI_RETRIES.inc(reason=kind)
+                count('gemini_retries')
+                if attempt + 1 >= self.max_attempts or not self._backoff(attempt, kind, end):
+                    break
+                continue
+            self.breaker.record_success()
+            GEMINI_CALLS.inc(outcome='ok')
+            count('gemini_calls')
+            return result, estimate
+        GEMINI_CALLS.inc(outcome='failed')
+        raise last
+
+    def generate_content(self, model, contents, config=None, deadline=None):
+        response, estimate = self._call(
+            lambda remaining: self.client.models.generate_content(
+                model=model, contents=contents, config=with_timeout(config, remaining)),
+            contents, deadline)
+        self._settle(response, estimate)
+        return response
+
+    def generate_content_stream(self, model, contents, config=None, deadline=None):
+        """Stream a response. Retries only happen before the first chunk has been received."""
+        def start(remaining):
+            stream = iter(self.client.models.generate_content_stream(
+                model=model, contents=contents, config=with_timeout(config, remaining)))
+            return stream, next(stream, None)
+
+        (stream, first), estimate = self._call(start, contents, deadline)
+        last = first
+        if first is not None:
+            yield first
+            for chunk in stream:
+                last = chunk
+                yield chunk
+        self._settle(last, estimate)
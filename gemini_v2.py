@@ -2,496 +2,586 @@ from google import genai
 from google.genai import types
 import pathlib
 import os
+import json
+import hashlib
+import logging
+import re
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
+from catalog_registry import CatalogRegistry, CatalogError
+from context_builder import CONTEXT_TOKENS, course_line
+from response_cache import make_key
+from postprocess import parse_response, parse_structured, LineAnnotator
+from pdf_text import extract_text, MAX_PAGES, MAX_CHARS
+from metrics import span, CACHE_REQUESTS
+from gemini_client import GeminiClient, CircuitOpenError, DEFAULT_RPM, DEFAULT_TPM
 load_dotenv()
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Retrieve and encode the PDF byte
-filepath = pathlib.Path('Resume.pdf')   
+log = logging.getLogger(__name__)
+
+MODEL = "gemini-2.5-flash"
+# Bump when the step-2 prompt changes so cached recommendations are not reused
+PROMPT_VERSION = "2"
+# Per-major step-2 candidates kept in memory, keyed by catalog version and major
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "256"))
+# Threads running prefetched stages (text extraction, step 1, course selection) per engine;
+# callers that prefetch for N concurrent requests should pass prefetch_workers >= N
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# How often a wait on a prefetched stage re-checks for cancellation, in seconds
+CANCEL_POLL = 0.25
+
+# Default locations used when run as a script
+filepath = pathlib.Path('Resume.pdf')
 courses_path = pathlib.Path('rutgers_courses_2025_9_NB.json')
 output_md = pathlib.Path('resume_recommendation.md')
 
-prompt = """
-You are an expert academic and career advisor.
-Analyze the provided resume carefully and, using the attached Rutgers courses catalog (JSON), provide:
-1. Course recommendations to strengthen the person’s skills.
-2. Possible career paths based on their experience, strengths, and interests.
-3. Key skills or technologies they should learn next.
-4. A short summary of their profile in 3–4 sentences.
-5. A future course plan: give a short-term (next 6–12 months) and long-term (1–3 years) recommended sequence of courses and learning milestones. When possible, reference specific Rutgers course codes/names from the attached JSON and explain why each course is recommended and what prerequisites or parallel learning (projects, tools) are suggested.
-
-Respond in a well-structured markdown format, using headings for each numbered section and a clear short roadmap for the future course plan.
-"""
-if not os.getenv("GEMINI_API_KEY"):
-    raise SystemExit("GEMINI_API_KEY not set in environment. Please add it to your .env or environment variables.")
-
-if not filepath.exists():
-    raise SystemExit(f"Resume file not found at {filepath.resolve()}")
+step1_prompt = (
+    "You are an expert career/major predictor.\n"
+    "Based only on the attached resume (PDF), return a SINGLE WORD that best describes the student's major (e.g., 'electrical', 'computer', 'anthropology').\n"
+    "Return ONLY that single word in plaintext, no JSON and no extra text.\n"
+)
+
+single_call_prompt = (
+    "You are an expert academic and career advisor.\n"
+    "Attached are the student's resume (PDF) and the Rutgers subject list ('<subject code>|<subject name>|<number of courses>').\n"
+    "1) Predict the student's major as a SINGLE lowercase word (e.g. 'electrical', 'computer', 'anthropology').\n"
+    "2) Recommend Rutgers courses, mostly (at least 80%) from subjects of that major and at most two cross-discipline electives. "
+    "Give each as a full course code 'school:subject:number' (e.g. '01:198:111') and its title; leave the code empty if you are not sure of it.\n"
+    "3) Give short-term (6–12 months) and long-term (1–3 years) roadmaps as lists of course titles or milestones.\n"
+    "4) In `markdown`, write the full advice: a 'Recommended Courses' section, a 'Course Roadmap' section, "
+    "career paths, key skills to learn and a 3–4 sentence summary.\n"
+)
+
+# Response schema for the single-call mode; the model's answer is JSON matching it
+STRUCTURED_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        'major': types.Schema(type=types.Type.STRING),
+        'recommended_courses': types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    'code': types.Schema(type=types.Type.STRING),
+                    'title': types.Schema(type=types.Type.STRING),
+                    'reason': types.Schema(type=types.Type.STRING),
+                },
+                required=['code', 'title'],
+            ),
+        ),
+        'short_term': types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+        'long_term': types.Schema(type=types.Type.ARRAY, items=types.Schema(type=types.Type.STRING)),
+        'markdown': types.Schema(type=types.Type.STRING),
+    },
+    required=['major', 'recommended_courses', 'short_term', 'long_term', 'markdown'],
+    property_ordering=['major', 'recommended_courses', 'short_term', 'long_term', 'markdown'],
+)
+
+class RecommendationError(RuntimeError):
+    """Raised when the recommendation pipeline cannot produce a result."""
+
+
+def read_resume(resume):
+    """The resume PDF as bytes: `resume` is the PDF itself (bytes) or a path to it. Read once
+    per request; every stage gets these bytes rather than going back to the file."""
+    if isinstance(resume, (bytes, bytearray, memoryview)):
+        return bytes(resume)
+    path = pathlib.Path(resume)
+    if not path.exists():
+        raise RecommendationError(f"Resume file not found at {path.resolve()}")
+    return path.read_bytes()
+
+
+class Prefetch:
+    """Stages of one resume started ahead of the pipeline (see RecommendationEngine.prefetch).
+
+    The pipeline waits on these futures instead of running the stages itself. Only the stages
+    hold the PDF bytes, so they are freed as the stages finish. cancel() drops stages that
+    have not started; a model call already in flight runs to completion (its answer still
+    reaches the response cache), but nothing waits for it.
+    """
+
+    def __init__(self, pdf_hash, catalog):
+        self.pdf_hash = pdf_hash
+        self.catalog = catalog
+        self.futures = {}
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in list(self.futures.values()):
+            future.cancel()
+
+    def check(self, cancelled=None):
+        """Raise RecommendationError if this upload was cancelled (or cancelled() says so)."""
+        if cancelled is not None and not self.cancelled.is_set() and cancelled():
+            self.cancel()
+        if self.cancelled.is_set():
+            raise RecommendationError("Cancelled")
+
+    def result(self, stage, cancelled=None):
+        """Wait for a stage's result, giving up as soon as the upload is cancelled."""
+        future = self.futures[stage]
+        while True:
+            self.check(cancelled)
+            try:
+                return future.result(timeout=CANCEL_POLL)
+            except FutureTimeout:
+                continue
+            except CancelledError:
+                raise RecommendationError("Cancelled")
+
+
+class RecommendationEngine:
+    """Holds a long-lived Gemini client and the loaded course catalogs so requests can run in-process.
+
+    Catalogs come from a CatalogRegistry (by default one holding just `courses_path`). Each
+    request resolves its catalog once and passes that snapshot down, so a background reload
+    never changes the catalog under a running request.
+
+    With single_call=True a resume is analysed in one schema-constrained call (see
+    recommend_structured) instead of the major prediction + recommendation pair.
+    """
+
+    def __init__(self, courses_path=courses_path, api_key=None, client=None, model=MODEL, cache=None,
+                 rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, single_call=False, context_tokens=CONTEXT_TOKENS,
+                 retrieval=True, catalogs=None, prefetch_workers=PREFETCH_WORKERS):
+        if client is None:
+            api_key = api_key or os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise RecommendationError("GEMINI_API_KEY not set in environment. Please add it to your .env or environment variables.")
+            client = genai.Client(api_key=api_key)
+        # Every model call goes through one shared limiter/retry/circuit-breaker wrapper
+        if not isinstance(client, GeminiClient):
+            client = GeminiClient(client, rpm=rpm, tpm=tpm)
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.single_call = single_call
+
+        if catalogs is None:
+            try:
+                catalogs = CatalogRegistry([courses_path], interval=0, context_tokens=context_tokens, retrieval=retrieval)
+            except CatalogError as e:
+                raise RecommendationError(str(e))
+        self.catalogs = catalogs
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="prefetch")
+
+    @property
+    def catalog(self):
+        """The default catalog as currently loaded."""
+        return self.catalogs.get()
+
+    def catalog_for(self, key=None):
+        """Snapshot of the catalog a request should use (a key like '2025_9_NB', a Catalog, or None for the default)."""
+        if key is not None and not isinstance(key, str):
+            return key
+        try:
+            return self.catalogs.get(key)
+        except CatalogError as e:
+            raise RecommendationError(str(e))
+
+    def cached(self, namespace, parts, compute):
+        """Return compute() through the response cache, keyed by namespace and parts."""
+        if self.cache is None:
+            return compute()
+        key = make_key(namespace, *parts)
+        value = self.cache.get(namespace, key)
+        if value is None:
+            value = compute()
+            self.cache.set(namespace, key, value)
+        return value
+
+    def resume_text(self, pdf_bytes, pdf_hash):
+        """Plain-text excerpt of the resume, extracted locally once per distinct PDF."""
+        def extract():
+            with span('pdf_text'):
+                return extract_text(pdf_bytes)
+        return self.cached('pdf_text', (pdf_hash, MAX_PAGES, MAX_CHARS), extract)
+
+    def predict_major(self, pdf_bytes, resume_text=''):
+        """Step 1: ask the model for a single-word major descriptor. Returns (word, raw step-1 text).
+
+        `resume_text` may be a future of the text; it is only awaited for the keyword fallback.
+        """
+        with span('step1'):
+            step1 = self.client.models.generate_content(
+                model=self.model,
+                contents=[
+                    types.Part.from_bytes(data=pdf_bytes, mime_type='application/pdf'),
+                    step1_prompt,
+                ])
 
-if not courses_path.exists():
-    raise SystemExit(f"Courses JSON file not found at {courses_path.resolve()}")
+        step1_text = getattr(step1, 'text', None) or str(step1)
+        # Extract the first word token from the response
+        m = re.search(r"[A-Za-z0-9_+-]+", step1_text)
+        if m:
+            return m.group(0).strip(), step1_text
 
-# Load courses JSON for local filtering
-import json
-import time
-try:
-    courses_data = json.loads(courses_path.read_text(encoding='utf-8'))
-except Exception as e:
-    raise SystemExit(f"Failed to read or parse courses JSON: {e}")
-
-try:
-    # Step 1: Ask model for a single-word major descriptor
-    step1_prompt = (
-        "You are an expert career/major predictor.\n"
-        "Based only on the attached resume (PDF), return a SINGLE WORD that best describes the student's major (e.g., 'electrical', 'computer', 'anthropology').\n"
-        "Return ONLY that single word in plaintext, no JSON and no extra text.\n"
-    )
-
-    step1 = client.models.generate_content(
-      model="gemini-2.5-flash",
-      contents=[
-          types.Part.from_bytes(data=filepath.read_bytes(), mime_type='application/pdf'),
-          step1_prompt,
-      ])
-
-    step1_text = getattr(step1, 'text', None) or str(step1)
-    import re
-    # Extract the first word token from the response
-    m = re.search(r"[A-Za-z0-9_+-]+", step1_text)
-    if m:
-        predicted_one_word = m.group(0).strip()
-    else:
-        # fallback to scanning resume bytes for common keywords
-        raw = filepath.read_bytes().decode('utf-8', errors='ignore').lower()
+        # fallback to scanning the extracted resume text for common keywords
+        if hasattr(resume_text, 'result'):
+            resume_text = resume_text.result()
+        raw = resume_text.lower()
         for kw in ('electrical', 'ece', 'computer', 'anthropology', 'civil'):
             if kw in raw:
-                predicted_one_word = kw
-                break
-        else:
-            predicted_one_word = 'undecided'
-
-    predicted_major_clean = predicted_one_word
-    predicted_major_safe = re.sub(r"[^0-9a-zA-Z_-]", "_", predicted_major_clean)
-
-    # courses_data may be a list or a dict with lists; attempt to get a list of course records
-    if isinstance(courses_data, dict):
-        lists = [v for v in courses_data.values() if isinstance(v, list)]
-        possible = lists[0] if lists else []
-    elif isinstance(courses_data, list):
-        possible = courses_data
-    else:
-        possible = []
-
-    # Filter by explicit 'major' field when present, else fall back to text match on title/description
-    def matches_major_field(course, major):
-        # check common keys
-        for key in ('major', 'majors', 'department', 'subject'):
-            val = course.get(key)
-            if not val:
-                continue
-            if isinstance(val, list):
-                vals = [str(x).lower() for x in val]
-                if major.lower() in ' '.join(vals):
-                    return True
-            else:
-                if major.lower() in str(val).lower():
-                    return True
-        return False
-
-    def text_match(course, major):
-        text = ' '.join([str(course.get(k, '')).lower() for k in ('title', 'description', 'name', 'catalog_description')])
-        return major.lower() in text
-
-    filtered = []
-    for c in possible:
-        if not isinstance(c, dict):
-            continue
-        if matches_major_field(c, predicted_major_clean):
-            filtered.append(c)
-        elif text_match(c, predicted_major_clean):
-            filtered.append(c)
-
-    # If filtering removed everything, fall back to a subset of possible
-    if not filtered:
-        filtered = possible[:100]
-
-    # We will not write an intermediate filtered JSON (per request). Instead collect selected course dicts
-    instructor_keys = {'instructor', 'instructors', 'faculty', 'professor', 'lecturer', 'course_instructor'}
-    selected_courses = []
-
-    # Also create a lightweight text file with course names (one per line) to reduce payload for step2
-    names_path = pathlib.Path(f"rutgers_course_names_{predicted_major_safe}.txt")
-    try:
-        count = 0
-        with names_path.open('w', encoding='utf-8') as fh:
-            for c in possible:
-                if not isinstance(c, dict):
-                    continue
-                # match the predicted single word against common fields
-                combined = ' '.join([str(c.get(k, '')).lower() for k in ('major', 'majors', 'department', 'subject', 'title', 'name', 'description', 'catalog_description')])
-                if predicted_major_clean.lower() in combined:
-                    # remove instructor-like keys for privacy before saving selection
-                    cleaned_course = {k: v for k, v in c.items() if k.lower() not in instructor_keys}
-                    selected_courses.append(cleaned_course)
-                    name = cleaned_course.get('title') or cleaned_course.get('name') or cleaned_course.get('course_title') or cleaned_course.get('course_code') or cleaned_course.get('code') or ''
-                    if name:
-                        fh.write(str(name).strip() + '\n')
-                        count += 1
-        print(f"Wrote lightweight course names to {names_path.resolve()} ({count} lines) — filtered by one-word major '{predicted_major_clean}'")
-    except Exception as e:
-        print(f"Warning: failed to write names file: {e}")
-
-    # Step 2: Ask model for recommendations using reduced course set
-    # Use the raw step1 text as the evidence snippet (step1 returned the one-word major)
-    evidence_snippet = (step1_text or '')[:300]
-    step2_prompt = (
-        f"You are an expert academic and career advisor. The predicted major based on the resume is '{predicted_major_clean}'. Evidence: {evidence_snippet}\n"
-        "Using the attached lightweight course name list (text) and the resume excerpt provided, do the following:\n"
-        "1) Prioritize recommending courses that belong to the predicted major (at least 80% of recommendations). You may include up to two cross-discipline electives.\n"
-        "2) Provide short-term (6–12 months) and long-term (1–3 years) course roadmaps, referencing Rutgers course codes/names when present.\n"
-        "3) Provide career paths and key skills to learn.\n"
-        "4) Provide a 3–4 sentence summary.\n"
-        "Respond in well-structured markdown. Also include a small JSON at the end with keys: recommended_courses (array of course codes), short_term (array), long_term (array) for machine parsing.\n"
-    )
-
-    # Send resume + filtered courses JSON (as text) + prompt
-    # Try sending the filtered course file; retry on transient server errors
-    response = None
-    last_exception = None
-    for attempt in range(3):
+                return kw, step1_text
+        return 'undecided', step1_text
+
+    def select_courses(self, major, resume_text='', catalog=None):
+        """Pick the step-2 courses. Returns (selected_courses, context) where context is the
+        'code|title' course list sent to the model.
+
+        Candidates come from BM25 retrieval of the resume text over the whole catalog, with the
+        major's index hits boosted. Without numpy or resume text they are the major's courses
+        ranked by title overlap. Either way they are packed as 'code|title' lines into the
+        token budget. The per-major part is memoized (see major_courses); only the ranking
+        against this resume runs per request.
+        """
+        catalog = self.catalog_for(catalog)
+        major_ids, default = self.major_courses(catalog, major)
+        if not resume_text:
+            return default
+        with span('select_courses'):
+            candidates = []
+            if catalog.retriever is not None:
+                candidates = catalog.retriever.search(resume_text, boost=major_ids)
+            if not candidates:
+                candidates = catalog.context.rank(major_ids or range(len(catalog.courses)), resume_text)
+            selected = self._pack(catalog, candidates)
+        log.info("Selected %d of %d candidate courses for major '%s'", len(selected[0]), len(candidates), major)
+        return selected
+
+    def major_courses(self, catalog, major):
+        """The index hits for `major` and the course list packed from them in catalog order (used
+        when there is no resume text). Memoized in a bounded LRU on the catalog per
+        (catalog version, major), so a repeated major costs nothing.
+        """
+        key = (catalog.version, major)
+        with catalog.contexts_lock:
+            if key in catalog.contexts:
+                catalog.contexts.move_to_end(key)
+                CACHE_REQUESTS.inc(cache='course_context', namespace=catalog.key, result='hit')
+                return catalog.contexts[key]
+
+        CACHE_REQUESTS.inc(cache='course_context', namespace=catalog.key, result='miss')
+        with span('major_courses'):
+            major_ids = catalog.index.search(major)
+            value = major_ids, self._pack(catalog, major_ids or range(len(catalog.courses)))
+        with catalog.contexts_lock:
+            catalog.contexts[key] = value
+            while len(catalog.contexts) > CONTEXT_CACHE_SIZE:
+                catalog.contexts.popitem(last=False)
+        return value
+
+    def _pack(self, catalog, candidates):
+        context, ids = catalog.context.pack(candidates)
+        # instructor names were dropped when the catalog was loaded (see catalog_tables.py)
+        return [catalog.courses[i] for i in ids], context
+
+    def build_step2_prompt(self, major, step1_text):
+        # Use the raw step1 text as the evidence snippet (step1 returned the one-word major)
+        evidence_snippet = (step1_text or '')[:300]
+        return (
+            f"You are an expert academic and career advisor. The predicted major based on the resume is '{major}'. Evidence: {evidence_snippet}\n"
+            "Using the attached course list (one 'code|title' per line, most relevant first) and the resume excerpt provided, do the following:\n"
+            "1) Prioritize recommending courses that belong to the predicted major (at least 80% of recommendations). You may include up to two cross-discipline electives.\n"
+            "2) Provide short-term (6–12 months) and long-term (1–3 years) course roadmaps, referencing Rutgers course codes/names when present.\n"
+            "3) Provide career paths and key skills to learn.\n"
+            "4) Provide a 3–4 sentence summary.\n"
+            "Respond in well-structured markdown. Also include a small JSON at the end with keys: recommended_courses (array of course codes), short_term (array), long_term (array) for machine parsing.\n"
+        )
+
+    def step2_contents(self, resume_text_excerpt, context, step2_prompt):
+        """Course list + resume excerpt + prompt, as sent for step 2."""
+        # attach the extracted resume text (if any) to give the model direct evidence
+        contents = [
+            types.Part.from_bytes(data=context.encode('utf-8'), mime_type='text/plain'),
+        ]
+        if resume_text_excerpt:
+            contents.append(types.Part.from_bytes(data=resume_text_excerpt.encode('utf-8'), mime_type='text/plain'))
+        contents.append(step2_prompt)
+        return contents
+
+    def generate_recommendations(self, resume_text, major, step1_text, selected_courses, context):
+        """Step 2: ask the model for recommendations using the reduced course set. Returns the raw response text."""
+        with span('step2'):
+            return self._generate_recommendations(resume_text, major, step1_text, selected_courses, context)
+
+    def _generate_recommendations(self, resume_text, major, step1_text, selected_courses, context):
+        step2_prompt = self.build_step2_prompt(major, step1_text)
+
+        # Send resume + filtered courses (as text) + prompt; the client wrapper handles
+        # rate limiting and retries of 429/5xx/timeouts
+        response = None
+        last_exception = None
         try:
-            print(f"Step2 request attempt {attempt+1}/3 — sending names text file ({names_path.name}) and resume excerpt")
-            # attach a small resume text excerpt (best-effort) to give the model direct evidence
-            try:
-                resume_text_excerpt = filepath.read_bytes().decode('utf-8', errors='ignore')[:5000]
-            except Exception:
-                resume_text_excerpt = ''
-
-            contents = [
-                types.Part.from_bytes(data=names_path.read_bytes(), mime_type='text/plain'),
-            ]
-            if resume_text_excerpt:
-                contents.append(types.Part.from_bytes(data=resume_text_excerpt.encode('utf-8'), mime_type='text/plain'))
-            contents.append(step2_prompt)
-
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=contents,
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=self.step2_contents(resume_text, context, step2_prompt),
             )
-            break
+        except CircuitOpenError:
+            raise
         except Exception as e:
             last_exception = e
-            msg = str(e)
-            print(f"Step2 attempt {attempt+1} failed: {msg}")
-            # If internal server error, retry with exponential backoff
-            if '500' in msg or 'INTERNAL' in msg.upper():
-                backoff = 2 ** attempt
-                print(f"Transient server error detected, retrying after {backoff}s...")
-                time.sleep(backoff)
-                continue
-            else:
-                # Non-transient error; break and handle below
-                break
+            log.warning("Step2 failed: %s", e)
 
-    if response is None:
-        # Fallback: create a condensed textual summary of filtered courses and resend once
-        print("Falling back to sending condensed course summary instead of full JSON.")
-        try:
-            # Build a short textual list: code - title: short description
-            summary_lines = []
-            for c in (selected_courses[:50] if isinstance(selected_courses, list) else []):
-                code = c.get('course_code') or c.get('code') or c.get('subject') or ''
-                title = c.get('title') or c.get('name') or ''
-                desc = c.get('description') or c.get('catalog_description') or ''
-                line = f"{code} - {title}: {desc}" if (code or title) else str(c)
-                summary_lines.append(line)
-            condensed = "\n".join(summary_lines)[:20000]
-
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
+        if response is None:
+            # Fallback: resend once with just the course list (already within the token budget)
+            log.warning("Falling back to sending the course list without the resume excerpt")
+            try:
+                condensed = "\n".join(filter(None, map(course_line, selected_courses)))
+
+                response = self.client.models.generate_content(
+                    model=self.model,
+                    contents=[
+                        types.Part.from_bytes(data=condensed.encode('utf-8'), mime_type='text/plain'),
+                        step2_prompt,
+                    ])
+            except Exception as e:
+                raise RecommendationError(f"Step2 failed after retries and fallback: {e}\nLast exception: {last_exception}")
+
+        # Some client responses may have .text or nested fields
+        text = getattr(response, 'text', None)
+        if not text:
+            text = str(response)
+        return text
+
+    def recommend_structured(self, pdf_bytes, catalog=None):
+        """Single call: resume + subject digest in, JSON (major, course codes, roadmap, markdown) out.
+
+        Returns the raw JSON text; course codes are resolved against the catalog in postprocess().
+        """
+        with span('single_call'):
+            response = self.client.models.generate_content(
+                model=self.model,
                 contents=[
-                    types.Part.from_bytes(data=condensed.encode('utf-8'), mime_type='text/plain'),
-                    step2_prompt,
-                ])
+                    types.Part.from_bytes(data=pdf_bytes, mime_type='application/pdf'),
+                    types.Part.from_bytes(data=self.catalog_for(catalog).digest.encode('utf-8'), mime_type='text/plain'),
+                    single_call_prompt,
+                ],
+                config=types.GenerateContentConfig(
+                    response_mime_type='application/json',
+                    response_schema=STRUCTURED_SCHEMA,
+                ),
+            )
+        text = getattr(response, 'text', None)
+        if not text:
+            raise RecommendationError("Single-call response was empty")
+        try:
+            json.loads(text)
+        except ValueError as e:
+            # do not let a malformed answer into the cache
+            raise RecommendationError(f"Single-call response was not valid JSON: {e}")
+        return text
+
+    def structured_text(self, pdf_bytes, pdf_hash, catalog):
+        return self.cached(
+            'structured',
+            (pdf_hash, catalog.version, PROMPT_VERSION),
+            lambda: self.recommend_structured(pdf_bytes, catalog),
+        )
+
+    def prefetch(self, resume, catalog=None, inline=False):
+        """Start the stages that need only the PDF, so they overlap with whatever comes before
+        the pipeline (an upload waiting in the job queue) and with each other. Returns a Prefetch.
+
+        Text extraction and the step-1 model call start at once and in parallel. When the major
+        arrives, the step-2 course list is selected as the 'courses' stage, which the pipeline
+        then waits on. With single_call
+        the one structured call starts instead. Stages run in the caller's context, so their
+        spans land in the caller's active trace.
+
+        With inline=True the stages run right here on the caller's thread and the returned
+        Prefetch is already complete. recommend() does this when it is not handed a prefetch,
+        so callers with their own threads (batch.py, the job queue) are never limited by the
+        engine's pool; the course list is then selected only if the recommendation is not cached.
+        """
+        pdf_bytes = read_resume(resume)
+        catalog = self.catalog_for(catalog)
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        warm = Prefetch(pdf_hash, catalog)
+        context = contextvars.copy_context()
+
+        def submit(stage, compute):
+            if inline:
+                future = warm.futures[stage] = Future()
+                try:
+                    future.set_result(compute())
+                except Exception as e:
+                    future.set_exception(e)
+                return future
+
+            def run():
+                warm.check()  # skip stages of an upload that was cancelled while they queued
+                return context.copy().run(compute)
+            warm.futures[stage] = self._prefetch_pool.submit(run)
+            return warm.futures[stage]
+
+        if self.single_call:
+            submit('structured', lambda: self.structured_text(pdf_bytes, pdf_hash, catalog))
+            return warm
+        text = submit('text', lambda: self.resume_text(pdf_bytes, pdf_hash))
+        major = submit('major', lambda: self.cached('major', (pdf_hash,), lambda: self.predict_major(pdf_bytes, text)))
+
+        if inline:
+            return warm
+        # registered now, not when the major arrives, so a pipeline that gets the major always
+        # finds this stage and waits on it instead of selecting the courses a second time
+        courses = warm.futures['courses'] = Future()
+
+        def select(future):
+            if future.cancelled() or future.exception() is not None or warm.cancelled.is_set():
+                courses.cancel()
+                return
+
+            def run():
+                if not courses.set_running_or_notify_cancel():
+                    return
+                try:
+                    warm.check()
+                    courses.set_result(context.copy().run(
+                        self.select_courses, future.result()[0], text.result(), catalog))
+                except Exception as e:
+                    courses.set_exception(e)
+            self._prefetch_pool.submit(run)
+        major.add_done_callback(select)
+        return warm
+
+    def prefetched_courses(self, prefetch, major, resume_text, cancelled=None):
+        """The step-2 (selected_courses, context) for `major`: the prefetch's 'courses' stage if
+        it has one, otherwise selected here."""
+        if 'courses' in prefetch.futures:
+            return prefetch.result('courses', cancelled)
+        return self.select_courses(major, resume_text, prefetch.catalog)
+
+    def recommend(self, resume=filepath, output_md=output_md, catalog=None, prefetch=None):
+        """Run the full pipeline for one resume and write the annotated markdown. Returns the markdown text.
+
+        `resume` is the PDF's bytes or a path to it. `catalog` is a registry key such as
+        '2025_9_NB' (None for the default catalog). `prefetch` is the result of prefetch() for
+        the same resume, if its stages were started earlier (it then also fixes the catalog).
+        """
+        prefetch = prefetch or self.prefetch(resume, catalog, inline=True)
+        catalog = prefetch.catalog
+
+        try:
+            pdf_hash = prefetch.pdf_hash
+            if self.single_call:
+                text = prefetch.result('structured')
+                return self.postprocess(text, output_md, structured=True, catalog=catalog)
+            resume_text = prefetch.result('text')
+            major, step1_text = prefetch.result('major')
+            # courses are only waited for (or selected) when the recommendation is not cached
+            text = self.cached(
+                'recommendation',
+                (pdf_hash, major, catalog.version, PROMPT_VERSION),
+                lambda: self.generate_recommendations(
+                    resume_text, major, step1_text, *self.prefetched_courses(prefetch, major, resume_text)),
+            )
+        except RecommendationError:
+            raise
         except Exception as e:
-            raise SystemExit(f"Step2 failed after retries and fallback: {e}\nLast exception: {last_exception}")
-    # Some client responses may have .text or nested fields; print safely and save to file
-    text = getattr(response, 'text', None)
-    if not text:
-        text = str(response)
-
-    print(text)
-    # Remove any trailing JSON/fenced JSON block from the model response before saving
-    try:
-        cleaned_text = re.sub(r"```json[\s\S]*?```", "", text)
-        cleaned_text = re.sub(r"\n?\{[\s\S]*\}\s*$", "", cleaned_text)
-    except Exception:
-        cleaned_text = text
+            raise RecommendationError(f"Request failed: {e}")
 
-    try:
-        output_md.write_text(cleaned_text, encoding='utf-8')
-        print(f"Saved recommendation to {output_md.resolve()}")
-    except Exception as e:
-        print(f"Failed to save output file: {e}")
-    # --- New: extract recommended course names and match to course codes in the original JSON ---
-    try:
-        import difflib
-        # 1) Try to extract trailing JSON block first
-        recs = None
-        json_match = None
-        m = re.search(r"```json\s*([\s\S]*?)\s*```", text)
-        if m:
-            json_match = m.group(1)
-        else:
-            m2 = re.search(r"(\{[\s\S]*\})\s*$", text)
-            if m2:
-                json_match = m2.group(1)
+        return self.postprocess(text, output_md, catalog=catalog)
 
-        if json_match:
-            try:
-                parsed = json.loads(json_match)
-                if isinstance(parsed, dict) and 'recommended_courses' in parsed:
-                    recs = parsed.get('recommended_courses')
-            except Exception:
-                recs = None
-
-        # 2) Fallback: extract lines under 'Recommended Courses' heading
-        if not recs:
-            m3 = re.search(r"###\s*Recommended Courses([\s\S]*?)(?:\n###|\n\n---|$)", text, re.IGNORECASE)
-            if m3:
-                block = m3.group(1)
-                # capture bullets or numbered lists
-                lines = [ln.strip(' *\t') for ln in block.splitlines() if ln.strip()]
-                # filter out short lines
-                recs = []
-                for ln in lines:
-                    # remove leading numbering
-                    ln2 = re.sub(r"^\d+\.\s*", '', ln)
-                    # take up to line content before a dash
-                    ln2 = ln2.split(' - ')[0].strip()
-                    if ln2:
-                        recs.append(ln2)
-
-        if not recs:
-            print("No recommended courses list found in model response; skipping code matching.")
-        else:
-            # Normalize courses_data to a list of dicts
-            if isinstance(courses_data, dict):
-                lists = [v for v in courses_data.values() if isinstance(v, list)]
-                candidates = lists[0] if lists else []
-            elif isinstance(courses_data, list):
-                candidates = courses_data
-            else:
-                candidates = []
-
-            # Build simple lookup lists
-            candidate_titles = []
-            title_to_course = {}
-            for c in candidates:
-                if not isinstance(c, dict):
-                    continue
-                title = (c.get('title') or c.get('name') or c.get('course_title') or '')
-                code = (c.get('course_code') or c.get('code') or c.get('subject') or '')
-                key = (title or code).strip()
-                if key:
-                    candidate_titles.append(key)
-                    title_to_course[key] = c
-
-            matched = []
-            for rec in recs:
-                found = None
-                rec_low = rec.lower()
-                # exact code match
-                for key, course in title_to_course.items():
-                    if key.lower() == rec_low:
-                        found = course
-                        break
-                # substring title match
-                if not found:
-                    for key, course in title_to_course.items():
-                        if rec_low in key.lower() or key.lower() in rec_low:
-                            found = course
-                            break
-                # fuzzy match
-                if not found and candidate_titles:
-                    best = difflib.get_close_matches(rec, candidate_titles, n=1, cutoff=0.6)
-                    if best:
-                        found = title_to_course.get(best[0])
-
-                matched_code = None
-                matched_title = None
-                if found:
-                    matched_code = (found.get('course_code') or found.get('code') or found.get('subject') or '')
-                    matched_title = (found.get('title') or found.get('name') or '')
-                matched.append({'recommended': rec, 'matched_code': matched_code, 'matched_title': matched_title})
-
-            # Do not write a mapping JSON file or a separate with_codes markdown (user requested no last JSON)
-            # Keep matched list in-memory for inline processing below
-            print(f"Matched {len(matched)} recommended courses (mapping not written to disk per user preference)")
-    except Exception as e:
-        print(f"Failed to extract/match recommended courses: {e}")
-    # Ensure mapping variable exists for downstream inline steps
-    mapping = matched if 'matched' in locals() else []
-    # --- New: create an inline-coded markdown where course lines contain matched codes ---
-    # First-pass: replace Recommended Courses (or similar) block inline
-    try:
-        mapping = matched if 'matched' in locals() else []
-        rec_to_code = {m['recommended']: (m.get('matched_code') or '').strip() for m in mapping}
-        md_text = output_md.read_text(encoding='utf-8')
-
-        def replace_block(match):
-            block = match.group(1)
-            block_lines = [ln for ln in block.splitlines() if ln.strip()]
-            out_lines = []
-            for ln in block_lines:
-                ln_clean = re.sub(r"^\s*[-*\d\.\)]+\s*", '', ln).strip()
-                code = rec_to_code.get(ln_clean)
-                if code:
-                    out_lines.append(f"- {ln_clean} ({code})")
-                else:
-                    out_lines.append(f"- {ln_clean}")
-            return '\n'.join(out_lines)
-
-        md_new = re.sub(r"###\s*Recommended Courses([\s\S]*?)(?:\n###|\n\n---|$)", lambda m: "### Recommended Courses\n\n" + replace_block(m) + "\n\n", md_text, flags=re.IGNORECASE)
-        output_md.write_text(md_new, encoding='utf-8')
-        print(f"Updated original recommendation file with inline codes: {output_md.resolve()}")
-    except Exception as e:
-        print(f"Failed to create inline-coded markdown: {e}")
-
-    # Second-pass: more robust line-by-line replacement (v2). This builds a fallback mapping
-    # from the saved markdown if the in-memory mapping is empty, then inserts codes inline.
+    def stream_recommend(self, resume=filepath, output_md=output_md, catalog=None, prefetch=None, cancelled=None):
+        """Like recommend(), but streams step 2 from the model.
+
+        Yields (event, data) pairs: 'status' progress messages, 'major', 'delta' chunks of
+        markdown (whole lines, with course codes already added to recommended-course items),
+        'reset' if a failed stream is being retried without streaming, and finally 'result'
+        with the same fully post-processed markdown recommend() would return.
+
+        `cancelled` is polled between stages and stream chunks; once it returns True the
+        prefetch is cancelled and RecommendationError('Cancelled') is raised.
+        """
+        try:
+            yield 'status', 'Reading your resume...'
+            prefetch = prefetch or self.prefetch(resume, catalog, inline=True)
+            catalog = prefetch.catalog
+            pdf_hash = prefetch.pdf_hash
+            if self.single_call:
+                # one JSON answer: nothing useful to stream before it is complete
+                yield 'status', 'Writing recommendations...'
+                text = prefetch.result('structured', cancelled)
+                major = json.loads(text).get('major') or 'undecided'
+                yield 'major', major
+                yield 'result', self.postprocess(text, output_md, structured=True, catalog=catalog)
+                return
+            resume_text = prefetch.result('text', cancelled)
+            major, step1_text = prefetch.result('major', cancelled)
+            yield 'major', major
+            yield 'status', 'Writing recommendations...'
+
+            key = make_key('recommendation', pdf_hash, major, catalog.version, PROMPT_VERSION)
+            text = self.cache.get('recommendation', key) if self.cache is not None else None
+            if text is None:
+                prefetch.check(cancelled)
+                selected_courses, context = self.prefetched_courses(prefetch, major, resume_text, cancelled)
+                # the span covers the stream and, if it fails, the non-streaming retry
+                with span('step2'):
+                    annotator = LineAnnotator(catalog.matcher)
+                    parts = []
+                    try:
+                        stream = self.client.models.generate_content_stream(
+                            model=self.model,
+                            contents=self.step2_contents(resume_text, context, self.build_step2_prompt(major, step1_text)),
+                        )
+                        for chunk in stream:
+                            prefetch.check(cancelled)
+                            piece = getattr(chunk, 'text', None) or ''
+                            parts.append(piece)
+                            out = annotator.feed(piece)
+                            if out:
+                                yield 'delta', out
+                        out = annotator.close()
+                        if out:
+                            yield 'delta', out
+                        text = ''.join(parts)
+                    except RecommendationError:
+                        raise
+                    except Exception as e:
+                        log.warning("Step2 stream failed: %s; retrying without streaming", e)
+                        yield 'reset', ''
+                        text = self._generate_recommendations(resume_text, major, step1_text, selected_courses, context)
+                if self.cache is not None:
+                    self.cache.set('recommendation', key, text)
+        except RecommendationError:
+            raise
+        except Exception as e:
+            raise RecommendationError(f"Request failed: {e}")
+
+        yield 'result', self.postprocess(text, output_md, catalog=catalog)
+
+    def postprocess(self, text, output_md=output_md, structured=False, catalog=None):
+        """Parse the model output once, add matched course codes inline and write the markdown
+        (and a structured .json next to it) once. Returns the markdown.
+
+        structured=True for single-call JSON answers, whose course list is resolved directly.
+        """
+        output_md = pathlib.Path(output_md)
+        with span('match'):
+            result = (parse_structured(text) if structured else parse_response(text)).annotate(self.catalog_for(catalog).matcher)
+            markdown = result.to_markdown()
+        matched = sum(1 for c in result.courses if c['matched_code'])
+        log.info("Matched %d/%d recommended courses", matched, len(result.courses))
+        try:
+            with span('write_output'):
+                output_md.write_text(markdown, encoding='utf-8')
+                output_md.with_suffix('.json').write_text(json.dumps(result.to_dict(), indent=2, ensure_ascii=False), encoding='utf-8')
+            log.info("Saved recommendation to %s", output_md.resolve())
+        except Exception as e:
+            log.warning("Failed to save output file: %s", e)
+        return markdown
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     try:
-        md_text2 = output_md.read_text(encoding='utf-8')
-        lines = md_text2.splitlines()
-
-        if not (mapping and any(m.get('matched_code') for m in mapping)):
-            # build candidate lookup from courses_data
-            import difflib
-            if isinstance(courses_data, dict):
-                lists = [v for v in courses_data.values() if isinstance(v, list)]
-                candidates = lists[0] if lists else []
-            elif isinstance(courses_data, list):
-                candidates = courses_data
-            else:
-                candidates = []
-
-            candidate_titles = []
-            title_to_course = {}
-            for c in candidates:
-                if not isinstance(c, dict):
-                    continue
-                title = (c.get('title') or c.get('name') or c.get('course_title') or '')
-                code = (c.get('course_code') or c.get('code') or c.get('subject') or '')
-                key = (title or code).strip()
-                if key:
-                    candidate_titles.append(key)
-                    title_to_course[key] = c
-
-            # find Recommended Courses or Course Roadmaps block
-            start_idx = None
-            end_idx = None
-            for i, ln in enumerate(lines):
-                if re.match(r"^###\s*Recommended Courses", ln, flags=re.IGNORECASE):
-                    start_idx = i
-                    break
-            if start_idx is None:
-                for i, ln in enumerate(lines):
-                    if re.match(r"^###\s*(Course Roadmaps|Course Roadmap)", ln, flags=re.IGNORECASE):
-                        start_idx = i
-                        break
-
-            if start_idx is not None:
-                for j in range(start_idx+1, len(lines)):
-                    if re.match(r"^###\s", lines[j]):
-                        end_idx = j
-                        break
-                if end_idx is None:
-                    for j in range(start_idx+1, len(lines)):
-                        if lines[j].strip().startswith('---'):
-                            end_idx = j
-                            break
-                if end_idx is None:
-                    end_idx = len(lines)
-
-                rec_lines = []
-                for k in range(start_idx+1, end_idx):
-                    ln = lines[k].strip()
-                    if not ln:
-                        continue
-                    ln_clean = re.sub(r"^\s*[-*\d\.\)]+\s*", '', ln).strip()
-                    if ln_clean:
-                        rec_lines.append(ln_clean)
-
-                new_mapping = []
-                for rec in rec_lines:
-                    found = None
-                    rec_low = rec.lower()
-                    for key in title_to_course:
-                        if key.lower() == rec_low:
-                            found = title_to_course[key]
-                            break
-                    if not found:
-                        for key in title_to_course:
-                            if rec_low in key.lower() or key.lower() in rec_low:
-                                found = title_to_course[key]
-                                break
-                    if not found and candidate_titles:
-                        best = difflib.get_close_matches(rec, candidate_titles, n=1, cutoff=0.6)
-                        if best:
-                            found = title_to_course.get(best[0])
-
-                    matched_code = ''
-                    if found:
-                        matched_code = (found.get('course_code') or found.get('code') or found.get('subject') or '')
-                    new_mapping.append({'recommended': rec, 'matched_code': matched_code})
-
-                mapping = new_mapping
-
-        # perform replacements using mapping
-        if mapping:
-            # recompute indices in case text changed
-            start_idx = None
-            end_idx = None
-            for i, ln in enumerate(lines):
-                if re.match(r"^###\s*Recommended Courses", ln, flags=re.IGNORECASE):
-                    start_idx = i
-                    break
-            if start_idx is None:
-                for i, ln in enumerate(lines):
-                    if re.match(r"^###\s*(Course Roadmaps|Course Roadmap)", ln, flags=re.IGNORECASE):
-                        start_idx = i
-                        break
-            if start_idx is not None:
-                for j in range(start_idx+1, len(lines)):
-                    if re.match(r"^###\s", lines[j]):
-                        end_idx = j
-                        break
-                if end_idx is None:
-                    for j in range(start_idx+1, len(lines)):
-                        if lines[j].strip().startswith('---'):
-                            end_idx = j
-                            break
-                if end_idx is None:
-                    end_idx = len(lines)
-
-                for k in range(start_idx+1, end_idx):
-                    line = lines[k]
-                    if not re.search(r"^\s*([*\-]|\d+\.)", line):
-                        continue
-                    for m in mapping:
-                        rec = m.get('recommended', '')
-                        code = (m.get('matched_code') or '').strip()
-                        if not rec or not code:
-                            continue
-                        if rec.lower() in line.lower():
-                            if code not in line:
-                                lines[k] = line.rstrip() + f" ({code})"
-                            break
-
-        md_v2 = '\n'.join(lines)
-        output_md.write_text(md_v2, encoding='utf-8')
-        print(f"Updated original recommendation file with v2 inline codes: {output_md.resolve()}")
-    except Exception as e:
-        print(f"Failed to create v2 inline-coded markdown: {e}")
-except Exception as e:
-    raise SystemExit(f"Request failed: {e}")
+        engine = RecommendationEngine(courses_path)
+        engine.recommend(filepath, output_md)
+    except RecommendationError as e:
+        raise SystemExit(str(e))
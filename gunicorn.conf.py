@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+# SSE streams hold a connection open for the whole analysis, so each worker serves requests
+# from a thread pool
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+# Load wsgi.py (and with it the engine) in the master before forking the workers
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # The engine's Gemini limiter was built in the master (preload_app) and every worker now
+    # holds a copy, so each keeps an equal part of GEMINI_RPM / GEMINI_TPM and together they
+    # stay within the project quota. get_engine() also starts this worker's catalog reload
+    # thread; the master only loaded the catalogs.
+    from app import get_engine
+    get_engine().client.share(1 / server.cfg.workers)
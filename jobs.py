@@ -0,0 +1,289 @@
+import json
+import os
+import pathlib
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Job state is mirrored to files in the job directory so that any worker process can serve it
+STATE_FILE = "job.json"
+EVENTS_FILE = "events.jsonl"
+# Created to cancel a job; seen by the worker process that runs it
+CANCEL_FILE = "cancel"
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# How often a job owned by another process is re-read while a client waits on it
+POLL_INTERVAL = 0.5
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at its pending limit."""
+
+
+class Job:
+    def __init__(self, job_id, workdir, params=None):
+        self.id = job_id
+        self.workdir = workdir
+        # request options for `run` (e.g. the chosen catalog)
+        self.params = params or {}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # stage timings and counts recorded while the job ran (see metrics.Trace)
+        self.trace = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # (event, data) pairs published while the job runs, for streaming to clients
+        self.events = []
+        self._changed = threading.Condition()
+        self._cancelled = threading.Event()
+        self._on_cancel = []
+
+    def publish(self, event, data=""):
+        with self._changed:
+            self.events.append((event, data))
+            with (self.workdir / EVENTS_FILE).open('a', encoding='utf-8') as fh:
+                fh.write(json.dumps([event, data]) + '\n')
+            self._changed.notify_all()
+
+    def save(self):
+        """Write the job state to its directory (atomically), for other worker processes."""
+        state = {**self.to_dict(), "result": self.result, "trace": self.trace}
+        tmp = self.workdir / f"{STATE_FILE}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(state), encoding='utf-8')
+        os.replace(tmp, self.workdir / STATE_FILE)
+
+    @property
+    def cancelled(self):
+        """True once cancel() was called for this job, in this or any other worker process."""
+        if not self._cancelled.is_set() and (self.workdir / CANCEL_FILE).exists():
+            self._cancelled.set()
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Ask the job to stop: a queued job never runs, a running one stops at its next check.
+        Callbacks registered with on_cancel() run in this process. Returns False if it already finished."""
+        if self.finished is not None:
+            return False
+        try:
+            (self.workdir / CANCEL_FILE).touch()
+        except OSError:
+            pass
+        self._cancelled.set()
+        callbacks, self._on_cancel = self._on_cancel, []
+        for callback in callbacks:
+            callback()
+        return True
+
+    def on_cancel(self, callback):
+        """Call callback() when the job is cancelled (at once if it already is)."""
+        if self._cancelled.is_set():
+            callback()
+        else:
+            self._on_cancel.append(callback)
+
+    def wait_events(self, after, timeout=15):
+        """Block until there are events past index `after` or the job finishes.
+
+        Returns (new_events, finished).
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after or self.finished is not None, timeout)
+            return self.events[after:], self.finished is not None
+
+    def finish(self):
+        with self._changed:
+            self.finished = time.time()
+            self.save()
+            self._changed.notify_all()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class StoredJob(Job):
+    """Read-only view of a job run by another worker process, reloaded from its directory."""
+
+    def __init__(self, job_id, workdir):
+        super().__init__(job_id, workdir)
+        self._events_offset = 0
+
+    @classmethod
+    def load(cls, job_id, workdir):
+        job = cls(job_id, workdir)
+        return job if job.refresh() else None
+
+    def refresh(self):
+        try:
+            state = json.loads((self.workdir / STATE_FILE).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+        for name in ("status", "error", "created", "started", "finished", "result", "trace"):
+            setattr(self, name, state.get(name))
+        try:
+            with (self.workdir / EVENTS_FILE).open('rb') as fh:
+                fh.seek(self._events_offset)
+                for line in fh:
+                    if not line.endswith(b'\n'):
+                        break  # still being written
+                    self.events.append(tuple(json.loads(line)))
+                    self._events_offset += len(line)
+        except OSError:
+            pass
+        return True
+
+    def wait_events(self, after, timeout=15):
+        end = time.monotonic() + timeout
+        while True:
+            # finished is read before the events so the last events are never missed
+            finished = self.finished is not None
+            self.refresh()
+            if len(self.events) > after or finished or time.monotonic() >= end:
+                return self.events[after:], finished
+            time.sleep(POLL_INTERVAL)
+
+
+class JobQueue:
+    """Bounded worker pool that runs resume analyses in the background, one isolated directory per job.
+
+    `run` is called as run(job) on a worker thread and its return value becomes the job result.
+    At most `max_workers` jobs run at once and at most `max_pending` may be queued or running
+    (both per process); finished jobs and their directories are dropped after `ttl` seconds.
+    Jobs started by another process sharing `storage_root` are served from their directory.
+    """
+
+    def __init__(self, run, storage_root="jobs", max_workers=2, max_pending=32, ttl=3600):
+        self.run = run
+        self.storage_root = pathlib.Path(storage_root)
+        self.storage_root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resume-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, save, params=None):
+        """Create a job, call save(workdir) to store its input, then enqueue it. Returns the Job.
+
+        The job takes its pending slot before save() runs, so save() is never called for a
+        submission refused with QueueFullError.
+        """
+        self.prune()
+        with self._lock:
+            pending = self._pending()
+            if pending >= self.max_pending:
+                raise QueueFullError(f"Too many jobs in progress ({pending}); try again later.")
+            job_id = uuid.uuid4().hex
+            workdir = self.storage_root / job_id
+            job = Job(job_id, workdir, params)
+            self._jobs[job_id] = job
+
+        try:
+            workdir.mkdir(parents=True)
+            save(workdir)
+            job.save()
+        except Exception:
+            self._discard(job_id)
+            raise
+
+        self._executor.submit(self._execute, job)
+        return job
+
+    def pending(self):
+        """Number of this process's jobs that are queued or running."""
+        with self._lock:
+            return self._pending()
+
+    def _pending(self):
+        return sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and JOB_ID_RE.match(job_id):
+            job = StoredJob.load(job_id, self.storage_root / job_id)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job of this or another worker process. Returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None or not job.cancel():
+            return job
+        with self._lock:
+            # a job still waiting for a worker thread finishes now and frees its pending slot
+            queued = job.status == QUEUED and job_id in self._jobs
+            if queued:
+                job.status = CANCELLED
+        if queued:
+            job.publish("error", "Cancelled.")
+            job.finish()
+        return job
+
+    def prune(self):
+        """Drop finished jobs older than the TTL along with their storage."""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]
+            own = set(self._jobs)
+        for job_id in expired:
+            self._discard(job_id)
+        # directories left by other (or restarted) worker processes
+        for workdir in self.storage_root.iterdir():
+            if workdir.name not in own and JOB_ID_RE.match(workdir.name):
+                try:
+                    stale = workdir.stat().st_mtime < cutoff
+                except OSError:
+                    continue
+                if stale:
+                    shutil.rmtree(workdir, ignore_errors=True)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _discard(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            shutil.rmtree(job.workdir, ignore_errors=True)
+
+    def _execute(self, job):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            job.status = RUNNING
+        if job.cancelled:
+            # cancelled from another process while it was queued; run the local callbacks too
+            job.cancel()
+            job.status = CANCELLED
+            job.publish("error", "Cancelled.")
+            job.finish()
+            return
+        job.started = time.time()
+        job.save()
+        try:
+            job.result = self.run(job)
+            job.status = DONE
+            job.publish("done")
+        except Exception as e:
+            job.error = "Cancelled." if job.cancelled else str(e)
+            job.status = CANCELLED if job.cancelled else FAILED
+            job.publish("error", job.error)
+        finally:
+            job.finish()
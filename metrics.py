@@ -0,0 +1,235 @@
+"""Prometheus-style metrics and per-request traces for the recommendation pipeline.
+
+Metrics live in memory in each process. When a snapshot directory is configured (see
+Registry.share), every process also writes its values there about once a second, and
+render() sums the snapshots of all live processes. That way one scrape of /metrics covers
+every gunicorn worker.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import pathlib
+import threading
+import time
+
+# Seconds; pipeline stages range from sub-millisecond lookups to minute-long model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SNAPSHOT_INTERVAL = 1.0
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        body = ','.join('{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"')) for n, v in pairs)
+        return '{' + body + '}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def merge(self, values, other):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def lines(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{self._labels(key)} {value}"
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            # per-bucket (not cumulative) counts, then sum and count
+            entry = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+            entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        self.registry.changed()
+
+    def merge(self, values, other):
+        for key, entry in other.items():
+            if key in values:
+                values[key] = [a + b for a, b in zip(values[key], entry)]
+            else:
+                values[key] = list(entry)
+
+    def lines(self, values):
+        for key, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), entry):
+                cumulative += n
+                yield f"{self.name}_bucket{self._labels(key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {entry[-2]}"
+            yield f"{self.name}_count{self._labels(key)} {entry[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.directory = None
+        self._dirty = threading.Event()
+        self._writer_pid = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def share(self, directory):
+        """Aggregate metrics across processes through snapshot files in `directory`."""
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _after_fork(self):
+        # a forked worker starts from zero (its parent keeps reporting what it recorded), with
+        # fresh locks in case another thread held them at fork time
+        self.lock = threading.Lock()
+        self._dirty = threading.Event()
+        for metric in self.metrics:
+            metric.values.clear()
+
+    def changed(self):
+        if self.directory is None:
+            return
+        self._dirty.set()
+        if self._writer_pid != os.getpid():
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._writer, name="metrics-snapshot", daemon=True).start()
+
+    def snapshot(self):
+        with self.lock:
+            return {m.name: [[list(k), v] for k, v in m.values.items()] for m in self.metrics}
+
+    def _writer(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            path = self.directory / f"{os.getpid()}.json"
+            tmp = path.with_suffix('.tmp')
+            try:
+                tmp.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"Warning: could not write metrics snapshot: {e}")
+            time.sleep(SNAPSHOT_INTERVAL)
+
+    def _others(self):
+        if self.directory is None:
+            return
+        for path in self.directory.glob('*.json'):
+            pid = int(path.stem) if path.stem.isdigit() else None
+            if pid is None or pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)  # a worker that has exited
+                continue
+            except PermissionError:
+                pass
+            try:
+                yield json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        merged = {m.name: {} for m in self.metrics}
+        for snap in [self.snapshot(), *self._others()]:
+            for metric in self.metrics:
+                metric.merge(merged[metric.name], {tuple(k): v for k, v in snap.get(metric.name, [])})
+        out = []
+        for metric in self.metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines(merged[metric.name]))
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram('resume_stage_seconds', 'Time spent in each pipeline stage.', ['stage'])
+GEMINI_CALLS = Counter('gemini_calls_total', 'Gemini API calls by outcome.', ['outcome'])
+GEMINI_RETRIES = Counter('gemini_retries_total', 'Gemini API call retries by error kind.', ['reason'])
+GEMINI_TOKENS = Counter('gemini_tokens_total', 'Tokens reported by Gemini usage metadata.', ['kind'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache, namespace and result.',
+                         ['cache', 'namespace', 'result'])
+
+
+class Trace:
+    """Per-request record of stage timings and counts (retries, tokens, cache hits)."""
+
+    def __init__(self):
+        self.spans = []
+        self.counts = {}
+        self.started = time.monotonic()
+
+    @contextlib.contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def to_dict(self):
+        return {
+            'total_seconds': round(time.monotonic() - self.started, 4),
+            'spans': [{'stage': stage, 'seconds': round(seconds, 4)} for stage, seconds in self.spans],
+            'counts': dict(self.counts),
+        }
+
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+def count(name, amount=1):
+    """Add to a count on the current request's trace, if there is one."""
+    trace = _current.get()
+    if trace is not None:
+        trace.counts[name] = trace.counts.get(name, 0) + amount
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time a pipeline stage into STAGE_SECONDS and the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _current.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed))
@@ -0,0 +1,103 @@
+import io
+import re
+import zlib
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional; a minimal built-in extractor is used instead
+    PdfReader = None
+
+MAX_PAGES = 5
+MAX_CHARS = 5000
+# Larger uploads are not parsed at all; the model still gets the PDF itself in step 1
+MAX_PDF_BYTES = 10 * 1024 * 1024
+# Readers accept the header anywhere in the first 1024 bytes
+PDF_MAGIC = b'%PDF-'
+HEADER_BYTES = 1024
+# Content-stream bytes decompressed per character of max_chars: text operators and positioning
+# take far more room than the text itself, but a small stream must not inflate to gigabytes
+STREAM_BYTES_PER_CHAR = 64
+
+
+def is_pdf(head):
+    """True if `head` (the first bytes of a file) carries a PDF header."""
+    return PDF_MAGIC in head[:HEADER_BYTES]
+
+
+def compact(text):
+    """Collapse runs of spaces and blank lines so the excerpt spends tokens on words."""
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" ?\n[ \n]*", "\n", text)
+    return text.strip()
+
+
+def _extract_pypdf(pdf_bytes, max_pages, max_chars):
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    parts = []
+    size = 0
+    for page in reader.pages[:max_pages]:
+        text = page.extract_text() or ''
+        parts.append(text)
+        size += len(text)
+        if size >= max_chars:
+            break
+    return '\n'.join(parts)
+
+
+_STREAM_RE = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.S)
+_TEXT_OP_RE = re.compile(rb"\((?:\\.|[^\\)])*\)\s*Tj|\[(?:[^\]]*)\]\s*TJ|T\*|Td|TD|ET")
+_STRING_RE = re.compile(rb"\(((?:\\.|[^\\)])*)\)")
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'', b'f': b'', b'(': b'(', b')': b')', b'\\': b'\\'}
+
+
+def _unescape(s):
+    s = re.sub(rb"\\([0-7]{1,3})", lambda m: bytes([int(m.group(1), 8) & 0xFF]), s)
+    return re.sub(rb"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), s)
+
+
+def _extract_builtin(pdf_bytes, max_pages, max_chars):
+    """Best-effort text from Tj/TJ operators in (Flate) content streams.
+
+    Handles simple PDFs written with standard fonts; anything else yields '' rather than
+    binary noise. Streams are not mapped to pages, so only max_chars bounds the work: each
+    stream is inflated to at most max_chars * STREAM_BYTES_PER_CHAR bytes.
+    """
+    out = []
+    size = 0
+    limit = max_chars * STREAM_BYTES_PER_CHAR
+    for m in _STREAM_RE.finditer(pdf_bytes):
+        data = m.group(1)
+        try:
+            data = zlib.decompressobj().decompress(data, limit)
+        except zlib.error:
+            pass
+        if b'Tj' not in data and b'TJ' not in data:
+            continue
+        for op in _TEXT_OP_RE.finditer(data):
+            token = op.group(0)
+            if token in (b'T*', b'Td', b'TD', b'ET'):
+                out.append('\n')
+                continue
+            text = b''.join(_unescape(s) for s in _STRING_RE.findall(token)).decode('latin-1')
+            # drop strings that are mostly non-printable (CID/hex font encodings)
+            if text and sum(ch.isprintable() for ch in text) >= 0.9 * len(text):
+                out.append(text)
+                size += len(text)
+        if size >= max_chars:
+            break
+    return ''.join(out)
+
+
+def extract_text(pdf_bytes, max_pages=MAX_PAGES, max_chars=MAX_CHARS):
+    """Return a compact plain-text excerpt of a PDF (at most max_pages pages / max_chars characters)."""
+    if not pdf_bytes or len(pdf_bytes) > MAX_PDF_BYTES or not is_pdf(pdf_bytes):
+        return ''
+    try:
+        if PdfReader is not None:
+            text = _extract_pypdf(pdf_bytes, max_pages, max_chars)
+        else:
+            text = _extract_builtin(pdf_bytes, max_pages, max_chars)
+    except Exception as e:
+        print(f"Warning: PDF text extraction failed: {e}")
+        return ''
+    return compact(text)[:max_chars]
@@ -0,0 +1,220 @@
+import json
+import re
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+COURSE_HEADING_RE = re.compile(r"^(Recommended Courses|Course Roadmaps?)\b", re.IGNORECASE)
+LIST_ITEM_RE = re.compile(r"^\s*([*\-]|\d+[\.\)])\s+")
+
+
+def item_text(line):
+    """The course name part of a list item: bullet/numbering and trailing ' - reason' removed."""
+    text = LIST_ITEM_RE.sub('', line).replace('**', '').replace('__', '').strip()
+    return text.split(' - ')[0].split(' — ')[0].strip()
+
+
+def course_code(course):
+    return (course.get('course_code') or course.get('code') or '').strip() if course else ''
+
+
+def annotate_line(line, matcher):
+    """Append the matched catalog code to a recommended-course list item. Returns (line, match)."""
+    rec = item_text(line)
+    found = matcher.match(rec) if rec else None
+    code = course_code(found)
+    if code and code not in line:
+        line = line.rstrip() + f" ({code})"
+    return line, {'recommended': rec, 'matched_code': code or None,
+                  'matched_title': (found.get('course_title') or found.get('title')) if found else None}
+
+
+def resolve_course(rec, matcher):
+    """Resolve one machine-readable recommendation (a code/title string, or a {code, title} dict)."""
+    if isinstance(rec, dict):
+        code, title = str(rec.get('code') or ''), str(rec.get('title') or '')
+        # a code the catalog does not know falls back to the title, never to a guess
+        found = (matcher.match_code(code) if code else None) or (matcher.match(title) if title else None)
+        label = title or code
+    else:
+        label = str(rec)
+        found = matcher.match(label)
+    return {'recommended': label, 'matched_code': course_code(found) or None,
+            'matched_title': (found.get('course_title') or found.get('title')) if found else None}
+
+
+def machine_data(block):
+    """The JSON object in the body of a ```json block, or None if the body is not one."""
+    try:
+        parsed = json.loads(block)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def split_machine_json(text):
+    """Separate the trailing machine-readable JSON (fenced or bare) from the markdown.
+
+    Returns (markdown, data) where data is the parsed dict, or {} if there was none. Only
+    fenced blocks that parse to an object are removed (the last one is the data); any other
+    ```json block stays in the markdown.
+    """
+    data = {}
+    fences = list(re.finditer(r"```json\s*([\s\S]*?)\s*```\n?", text))
+    if fences:
+        kept, last = [], 0
+        for m in fences:
+            parsed = machine_data(m.group(1))
+            if parsed is not None:
+                data = parsed
+                kept.append(text[last:m.start()])
+                last = m.end()
+        kept.append(text[last:])
+        return ''.join(kept).rstrip() + '\n', data
+
+    # A bare object at the end: take the last line that starts one and parses to the end
+    stripped = text.rstrip()
+    if stripped.endswith('}'):
+        for m in reversed(list(re.finditer(r"(?m)^\s*\{", stripped))):
+            try:
+                parsed = json.loads(stripped[m.start():])
+            except ValueError:
+                continue
+            if isinstance(parsed, dict):
+                return stripped[:m.start()].rstrip() + '\n', parsed
+    return text, data
+
+
+class ParsedResponse:
+    """The model's step-2 answer parsed once: markdown lines, sections and the trailing JSON."""
+
+    def __init__(self, lines, data, structured=False):
+        self.lines = lines
+        self.data = data
+        # structured=True when `data` came from a JSON-schema response rather than scraped text
+        self.structured = structured
+        self.courses = []
+        # [heading, level, heading line index, end index]; a section runs until the next
+        # heading of the same or a higher level, so subsections stay inside it
+        self.sections = []
+        open_sections = []
+        for i, ln in enumerate(lines):
+            m = HEADING_RE.match(ln)
+            if not m:
+                continue
+            level = len(m.group(1))
+            while open_sections and open_sections[-1][1] >= level:
+                open_sections.pop()[3] = i
+            section = [m.group(2), level, i, len(lines)]
+            self.sections.append(section)
+            open_sections.append(section)
+
+    def course_sections(self):
+        """Line ranges (start, end) of the Recommended Courses / Course Roadmap sections."""
+        for heading, _, start, end in self.sections:
+            if not COURSE_HEADING_RE.match(heading):
+                continue
+            for j in range(start + 1, end):
+                if self.lines[j].strip().startswith('---'):
+                    end = j
+                    break
+            yield start, end
+
+    def annotate(self, matcher):
+        """Add matched course codes to list items of the course sections, in one pass."""
+        inline = []
+        self.courses = []
+        for start, end in self.course_sections():
+            for j in range(start + 1, end):
+                if LIST_ITEM_RE.match(self.lines[j]):
+                    self.lines[j], match = annotate_line(self.lines[j], matcher)
+                    inline.append(match)
+        if self.structured or not inline:
+            # the machine-readable list is authoritative when the model was schema-constrained
+            self.courses = [resolve_course(rec, matcher) for rec in self.data.get('recommended_courses') or []]
+        if not self.courses:
+            self.courses = inline
+        return self
+
+    def to_markdown(self):
+        return '\n'.join(self.lines)
+
+    def to_dict(self):
+        return {
+            'major': self.data.get('major'),
+            'sections': [heading for heading, _, _, _ in self.sections],
+            'recommended_courses': self.courses,
+            'short_term': self.data.get('short_term') or [],
+            'long_term': self.data.get('long_term') or [],
+            'markdown': self.to_markdown(),
+        }
+
+
+def parse_response(text):
+    markdown, data = split_machine_json(text or '')
+    return ParsedResponse(markdown.rstrip('\n').split('\n'), data)
+
+
+def parse_structured(payload):
+    """Build a ParsedResponse from a single-call JSON answer (major, recommended_courses, roadmap, markdown)."""
+    data = json.loads(payload) if isinstance(payload, str) else dict(payload)
+    markdown = str(data.pop('markdown', '') or '')
+    return ParsedResponse(markdown.rstrip('\n').split('\n'), data, structured=True)
+
+
+class LineAnnotator:
+    """Incrementally annotates streamed markdown: each completed list item under a course
+    heading gets its matched catalog code appended. A fenced ```json block is held back until
+    it closes and dropped if it is machine data, the same as split_machine_json does."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.pending = ''
+        self.block_level = None
+        # lines of the ```json block being held back, or None outside one
+        self.fence = None
+
+    def feed(self, piece):
+        self.pending += piece
+        if '\n' not in self.pending:
+            return ''
+        complete, self.pending = self.pending.rsplit('\n', 1)
+        return ''.join(self.line(ln) for ln in complete.split('\n'))
+
+    def close(self):
+        rest, self.pending = self.pending, ''
+        out = self.line(rest) if rest else ''
+        if self.fence is not None:
+            # a block that never closed is not machine data
+            out += self.release()
+        return out[:-1] if rest and out.endswith('\n') else out
+
+    def line(self, line):
+        """Output for one complete line (with its newline); '' while a ```json block is held back."""
+        stripped = line.strip()
+        if self.fence is None:
+            if not stripped.startswith('```json'):
+                return self.annotate(line) + '\n'
+            self.fence = []
+        self.fence.append(line)
+        if len(self.fence) == 1 or not stripped.startswith('```'):
+            return ''
+        if machine_data('\n'.join(self.fence[1:-1])) is not None:
+            self.fence = None
+            return ''
+        return self.release()
+
+    def release(self):
+        block, self.fence = self.fence, None
+        return ''.join(self.annotate(ln) + '\n' for ln in block)
+
+    def annotate(self, line):
+        m = HEADING_RE.match(line)
+        if m:
+            level = len(m.group(1))
+            if self.block_level is None or level <= self.block_level:
+                self.block_level = level if COURSE_HEADING_RE.match(m.group(2)) else None
+            return line
+        if line.strip().startswith('---'):
+            self.block_level = None
+        if self.block_level is None or not LIST_ITEM_RE.match(line):
+            return line
+        return annotate_line(line, self.matcher)[0]
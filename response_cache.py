@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from metrics import CACHE_REQUESTS, count
+
+log = logging.getLogger(__name__)
+
+
+def make_key(*parts):
+    """Build a cache key from ordered parts (e.g. step name, PDF hash, major, versions)."""
+    return hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache for model responses with TTL expiry and size-based LRU eviction.
+
+    Values are stored as JSON. Entries older than `ttl` seconds are treated as misses, and once
+    the stored values exceed `max_bytes` the least recently read entries are evicted.
+    Hit/miss counters are kept per namespace for the lifetime of the process.
+
+    The cache is optional: a SQLite error (e.g. "database is locked" while another worker
+    process writes) is logged and counted, and the lookup is a miss or the write is skipped.
+    """
+
+    def __init__(self, path="cache/responses.sqlite3", ttl=7 * 24 * 3600, max_bytes=64 * 1024 * 1024):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, namespace TEXT, value TEXT,"
+            " size INTEGER, created REAL, accessed REAL)"
+        )
+        self._db().execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _db(self):
+        # A SQLite connection must not be used across fork (gunicorn preload_app), so each
+        # process opens its own on first use
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, namespace, key):
+        """Return the cached value, or None on a miss, an expired entry or a database error."""
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db().execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    self._db().execute("DELETE FROM entries WHERE key = ?", (key,))
+                    row = None
+                if row is not None:
+                    self._db().execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                self._failed(namespace, 'read', e)
+                return None
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            else:
+                self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        result = 'miss' if row is None else 'hit'
+        CACHE_REQUESTS.inc(cache='response', namespace=namespace, result=result)
+        count('cache_misses' if row is None else 'cache_hits')
+        return None if row is None else json.loads(row[0])
+
+    def set(self, namespace, key, value):
+        """Store a value; on a database error the write is skipped."""
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            try:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO entries (key, namespace, value, size, created, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, data, len(data.encode('utf-8')), now, now),
+                )
+                self._evict()
+            except sqlite3.Error as e:
+                self._failed(namespace, 'write', e)
+
+    def _failed(self, namespace, action, error):
+        # called with the lock held
+        self.errors += 1
+        CACHE_REQUESTS.inc(cache='response', namespace=namespace, result='error')
+        count('cache_errors')
+        log.warning("Response cache %s failed (%s): %s", action, namespace, error)
+
+    def _evict(self):
+        self._db().execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+        total = self._db().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db().execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._db().execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            try:
+                entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            except sqlite3.Error as e:
+                log.warning("Response cache stats failed: %s", e)
+                entries, size = None, None
+            namespaces = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": entries,
+                "bytes": size,
+                "errors": self.errors,
+                "hits": {ns: self.hits.get(ns, 0) for ns in namespaces},
+                "misses": {ns: self.misses.get(ns, 0) for ns in namespaces},
+            }
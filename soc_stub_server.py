@@ -0,0 +1,68 @@
+"""Local stand-in for the Rutgers SOC courses.json endpoint, serving recorded payloads.
+
+Payloads are read from <dir>/courses_<year>_<term>_<campus>.json (raw SOC API responses).
+Responses carry an ETag and Last-Modified and honour If-None-Match, so the incremental
+refresh in coursescrapper.py can be exercised offline:
+
+    python soc_stub_server.py recorded/ --port 8765
+    python coursescrapper.py --refresh --url http://127.0.0.1:8765/soc/api/courses.json --campuses NB NK CM
+"""
+import argparse
+import hashlib
+import pathlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_handler(payload_dir):
+    payload_dir = pathlib.Path(payload_dir)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.endswith("/courses.json"):
+                self.send_error(404)
+                return
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = payload_dir / f"courses_{q.get('year')}_{q.get('term')}_{q.get('campus')}.json"
+            if not path.exists():
+                self.send_error(404, f"no recorded payload {path.name}")
+                return
+
+            body = path.read_bytes()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            last_modified = formatdate(path.stat().st_mtime, usegmt=True)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(payload_dir, host="127.0.0.1", port=8765):
+    server = ThreadingHTTPServer((host, port), make_handler(payload_dir))
+    print(f"Serving recorded SOC payloads from {payload_dir} on http://{host}:{server.server_port}/soc/api/courses.json")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("payload_dir")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    serve(args.payload_dir, args.host, args.port).serve_forever()
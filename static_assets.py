@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import mimetypes
+import pathlib
+import threading
+
+from flask import Response, abort, request
+
+# Smaller files are not worth a Content-Encoding
+MIN_GZIP_BYTES = 512
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class StaticAssets:
+    """Serves whitelisted front-end files with ETag, Cache-Control and gzip.
+
+    Each file is read, hashed and compressed once and kept in memory until its mtime or size
+    changes, so a request is a dictionary lookup plus a conditional-request check.
+    """
+
+    def __init__(self, root, extensions, max_age=300):
+        self.root = pathlib.Path(root).resolve()
+        self.extensions = extensions
+        self.max_age = max_age
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _path(self, filename):
+        path = (self.root / filename).resolve()
+        if path.suffix.lower() not in self.extensions or not path.is_relative_to(self.root):
+            return None
+        if any(part.startswith('.') for part in path.relative_to(self.root).parts):
+            return None
+        return path if path.is_file() else None
+
+    def _load(self, filename):
+        path = self._path(filename)
+        if path is None:
+            return None
+        st = path.stat()
+        with self._lock:
+            entry = self._files.get(path)
+        if entry is not None and entry['stamp'] == (st.st_mtime_ns, st.st_size):
+            return entry
+        data = path.read_bytes()
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        gz = None
+        if len(data) >= MIN_GZIP_BYTES and mimetype.startswith(COMPRESSIBLE):
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) >= len(data):
+                gz = None
+        entry = {
+            'stamp': (st.st_mtime_ns, st.st_size),
+            'mtime': st.st_mtime,
+            'mimetype': mimetype,
+            'etag': hashlib.sha256(data).hexdigest()[:20],
+            'data': data,
+            'gzip': gz,
+        }
+        with self._lock:
+            self._files[path] = entry
+        return entry
+
+    def response(self, filename):
+        entry = self._load(filename)
+        if entry is None:
+            abort(404)
+        use_gzip = entry['gzip'] is not None and 'gzip' in request.accept_encodings
+        resp = Response(entry['gzip'] if use_gzip else entry['data'], mimetype=entry['mimetype'])
+        if use_gzip:
+            resp.headers['Content-Encoding'] = 'gzip'
+        # the two encodings are different representations, so they get different ETags
+        resp.set_etag(entry['etag'] + ('-gz' if use_gzip else ''))
+        resp.last_modified = entry['mtime']
+        resp.cache_control.public = True
+        resp.cache_control.max_age = self.max_age
+        resp.vary.add('Accept-Encoding')
+        return resp.make_conditional(request)
@@ -0,0 +1,20 @@
+import json
+import os
+import pathlib
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATALOG = pathlib.Path(__file__).resolve().parent.parent / 'rutgers_courses_2025_9_NB.json'
+
+
+@pytest.fixture(scope='session')
+def matcher():
+    """A CourseMatcher over the shipped New Brunswick catalog."""
+    from catalog_tables import expand
+    from course_matcher import CourseMatcher
+    with CATALOG.open(encoding='utf-8') as f:
+        return CourseMatcher(expand(json.load(f)))
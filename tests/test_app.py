@@ -0,0 +1,123 @@
+import io
+import os
+import tempfile
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('google.genai')
+
+# app.py reads its settings at import, so point it at throwaway storage first
+_tmp = tempfile.mkdtemp(prefix='test-app-')
+os.environ.update({
+    'UPLOAD_FOLDER': os.path.join(_tmp, 'jobs'),
+    'RESPONSE_CACHE_PATH': os.path.join(_tmp, 'responses.sqlite3'),
+    'RETRIEVAL_CACHE_DIR': _tmp,
+    'METRICS_DIR': '',
+    'CATALOG_RELOAD_SECONDS': '0',
+})
+
+import app as web  # noqa: E402
+from bench_pipeline import RESUME_LINES, make_pdf  # noqa: E402
+from catalog_registry import CatalogRegistry  # noqa: E402
+from conftest import CATALOG  # noqa: E402
+from fake_gemini import FakeClient  # noqa: E402
+from gemini_v2 import RecommendationEngine, RecommendationError  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def catalogs():
+    return CatalogRegistry([CATALOG], interval=0)
+
+
+@pytest.fixture
+def engine(catalogs):
+    """Install an engine backed by the fake Gemini client; `latency` is seconds per model call."""
+    def install(latency=0.0):
+        web._engine = RecommendationEngine(client=FakeClient(latency=latency), cache=None, catalogs=catalogs,
+                                           rpm=10 ** 6, tpm=10 ** 9)
+        return web._engine
+    yield install
+    web._engine = None
+
+
+@pytest.fixture
+def client():
+    return web.app.test_client()
+
+
+def upload(client, name, **form):
+    # a distinct resume per upload, so nothing is answered from a cache
+    pdf = make_pdf(RESUME_LINES + (f"Applicant {name}",))
+    res = client.post('/upload', data={'resume': (io.BytesIO(pdf), f'{name}.pdf'), **form},
+                      content_type='multipart/form-data')
+    assert res.status_code == 202, res.get_json()
+    return res.get_json()['job_id']
+
+
+def result(client, job_id, timeout=10):
+    end = time.monotonic() + timeout
+    while True:
+        res = client.get(f'/jobs/{job_id}/result')
+        if res.status_code != 202:
+            return res
+        assert time.monotonic() < end, 'job did not finish'
+        time.sleep(0.02)
+
+
+def test_upload_runs_to_result(engine, client):
+    engine()
+    job_id = upload(client, 'done')
+    res = result(client, job_id)
+    assert res.status_code == 200
+    assert res.get_json()['status'] == 'done'
+    assert '**Data Structures** - core foundation for software engineering roles (01:198:112)' in res.get_json()['response']
+    assert client.get(f'/jobs/{job_id}').get_json()['status'] == 'done'
+    events = client.get(f'/jobs/{job_id}/events').get_data(as_text=True)
+    assert 'event: major\ndata: computer' in events and 'event: done' in events
+
+
+def test_cancel_returns_410(engine, client):
+    engine(latency=0.3)
+    job_id = upload(client, 'cancelled')
+    assert client.post(f'/jobs/{job_id}/cancel').status_code == 200
+    res = result(client, job_id)
+    assert res.status_code == 410
+    assert res.get_json() == {'status': 'cancelled'}
+    assert client.post('/jobs/' + '0' * 32 + '/cancel').status_code == 404
+
+
+def test_new_upload_replaces_the_previous_one(engine, client):
+    engine(latency=0.3)
+    first = upload(client, 'first')
+    second = upload(client, 'second', replaces=first)
+    assert result(client, first).status_code == 410
+    assert result(client, second).status_code == 200
+
+
+def test_rejects_non_pdf(engine, client):
+    engine()
+    res = client.post('/upload', data={'resume': (io.BytesIO(b'hello'), 'r.pdf')}, content_type='multipart/form-data')
+    assert res.status_code == 400
+
+
+def test_prefetch_selects_courses_once(engine, tmp_path):
+    eng = engine(latency=0.05)
+    calls = []
+    select = eng.select_courses
+    eng.select_courses = lambda *args: calls.append(args[0]) or select(*args)
+
+    prefetch = eng.prefetch(make_pdf(RESUME_LINES + ('Applicant prefetch',)))
+    markdown = eng.recommend(output_md=tmp_path / 'out.md', prefetch=prefetch)
+    assert '(01:198:112)' in markdown
+    assert calls == ['computer']
+
+
+def test_cancelled_prefetch_stops_the_pipeline(engine, tmp_path):
+    eng = engine(latency=0.3)
+    prefetch = eng.prefetch(make_pdf(RESUME_LINES + ('Applicant cancelled prefetch',)))
+    prefetch.cancel()
+    with pytest.raises(RecommendationError, match='Cancelled'):
+        eng.recommend(output_md=tmp_path / 'out.md', prefetch=prefetch)
+    assert not (tmp_path / 'out.md').exists()
@@ -0,0 +1,34 @@
+from catalog_index import CatalogIndex
+from catalog_tables import expand, normalize
+
+RECORDS = [
+    {'major': 'Religion', 'course_code': '01:840:123', 'course_title': 'BIBLE IN ARAMAIC',
+     'instructors': ['HABERL, CHARLES'], 'cross_listed': ['01:013:111']},
+    {'major': 'African, Middle Eastern, and South Asian Languages and Literatures', 'course_code': '01:013:111',
+     'course_title': 'BIBLE IN ARAMAIC', 'instructors': ['HABERL, CHARLES']},
+    {'major': 'Jewish Studies', 'course_code': '01:563:140', 'course_title': 'JEWISH SOCIETY', 'instructors': ['X, Y']},
+    {'major': 'History', 'course_code': '01:506:140', 'course_title': 'JEWISH SOCIETY', 'instructors': ['X, Y']},
+]
+
+
+def test_cross_listed_group_keeps_every_major():
+    doc = normalize(RECORDS)
+    assert len(doc['courses']) == 2
+    index = CatalogIndex(expand(doc))
+    for major in ('religion', 'african', 'jewish', 'history'):
+        assert index.search(major), major
+    assert index.search('religion') == index.search('african')
+
+
+def test_instructors_are_a_table_dropped_on_load():
+    doc = normalize(RECORDS)
+    assert doc['instructors'] == ['HABERL, CHARLES', 'X, Y']
+    assert [c['instructors'] for c in doc['courses']] == [[0], [1]]
+    assert all('instructors' not in r for r in expand(doc))
+    assert expand(doc, instructors=True)[0]['instructors'] == ['HABERL, CHARLES']
+    assert 'instructors' not in normalize(RECORDS, instructors=False)
+
+
+def test_normalize_round_trips():
+    doc = normalize(RECORDS)
+    assert normalize(expand(doc, instructors=True)) == doc
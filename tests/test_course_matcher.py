@@ -0,0 +1,58 @@
+import pytest
+
+
+def code(matcher, text):
+    course = matcher.match(text)
+    return course and course['course_code']
+
+
+@pytest.mark.parametrize('text, expected', [
+    # exact titles
+    ('Data Structures', '01:198:112'),
+    ('Software Methodology', '01:198:213'),
+    ('General Psychology', '01:830:101'),
+    ('Linear Algebra', '01:640:350'),
+    ('Deep Learning', '01:198:462'),
+    # catalog titles abbreviated to 20 characters
+    ('Introduction to Computer Science', '01:198:111'),
+    ('Introduction to Artificial Intelligence', '01:198:440'),
+    ('Introduction to Discrete Structures I', '01:198:205'),
+    ('Discrete Structures II', '01:198:206'),
+    ('Design and Analysis of Computer Algorithms', '01:198:344'),
+    ('Principles of Information and Data Management', '01:198:336'),
+    ('Computer Architecture', '01:198:211'),
+    ('Introduction to Microeconomics', '01:220:102'),
+    ('Intro to Macroeconomics', '01:220:103'),
+    ('Elementary Organic Chemistry', '01:160:209'),
+    ('Multivariable Calculus', '01:640:251'),
+    ('Database Implementation', '01:198:437'),
+    # abbreviations in the recommendation
+    ('Intro to CS', '01:198:111'),
+    ('Intro to AI', '01:198:440'),
+    # markdown around the title, and codes in the text
+    ('1. **Data Structures** - core foundation', '01:198:112'),
+    ('Systems Programming (01:198:214)', '01:198:214'),
+    ('CS 198:211', '01:198:211'),
+    # a cross-listed course answers to its other code
+    ('01:074:140', '01:013:140'),
+])
+def test_matches(matcher, text, expected):
+    assert code(matcher, text) == expected
+
+
+@pytest.mark.parametrize('text, wrong', [
+    # a shared abbreviation is not enough when the title has other specific words
+    ('Compilers', '01:750:345'),            # COMP ASTRO
+    ('Intro to Psychology', '15:295:512'),  # INTRO TO CHILD PSYCH
+    ('Intro to Psych', '15:295:512'),
+    # a recommendation word is not an abbreviation of a longer title word
+    ('Abnormal Psychology', '01:830:340'),  # PSYCHOPATHOLOGY
+])
+def test_rejects_other_courses(matcher, text, wrong):
+    assert code(matcher, text) != wrong
+
+
+def test_no_match(matcher):
+    assert matcher.match('Compilers') is None
+    assert matcher.match('Underwater Basket Weaving') is None
+    assert matcher.match('') is None
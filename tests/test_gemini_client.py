@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+pytest.importorskip('google.genai')
+
+from gemini_client import CircuitBreaker, CircuitOpenError, DeadlineExceededError, GeminiClient
+
+
+class Models:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return None
+
+
+class Client:
+    def __init__(self):
+        self.models = Models()
+
+
+def half_open_client():
+    breaker = CircuitBreaker(threshold=1, reset_after=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == 'half-open'
+    client = GeminiClient(Client(), rpm=1, breaker=breaker)
+    return client, breaker
+
+
+def test_reserve_deadline_releases_half_open_trial():
+    client, breaker = half_open_client()
+    client.requests.tokens = 0  # empty request bucket: the wait would pass the deadline
+    with pytest.raises(DeadlineExceededError):
+        client.generate_content('m', 'hello', deadline=0.5)
+    assert client.client.models.calls == 0
+    assert not breaker.trial_in_flight
+    assert breaker.state == 'half-open'
+
+    client.requests.tokens = 1
+    client.generate_content('m', 'hello', deadline=0.5)
+    assert client.client.models.calls == 1
+    assert breaker.state == 'closed'
+
+
+def test_open_circuit_still_rejects_without_calling():
+    breaker = CircuitBreaker(threshold=1, reset_after=60)
+    breaker.record_failure()
+    client = GeminiClient(Client(), breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        client.generate_content('m', 'hello')
+    assert client.client.models.calls == 0
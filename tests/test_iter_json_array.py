@@ -0,0 +1,47 @@
+import json
+import random
+
+import pytest
+
+pytest.importorskip('requests')
+
+from coursescrapper import iter_json_array
+
+DOCS = [
+    '[]',
+    '[-1.5]',
+    '[1, -22.25e-3, 3E+10, 0, -0.0]',
+    '[123456789012345678901234567890, 1.0000000000000002]',
+    '[true, false, null, "a,]b", "\\u00e9\\"x"]',
+    ' [ {"title": "CALC II", "n": [1, 2.5, {"x": -7}]} , "Café – \U0001f600" ] ',
+    json.dumps([{'courseString': f'01:{i:03d}:{i * 7 % 500:03d}', 'credits': i / 3} for i in range(50)]),
+]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('doc', DOCS)
+def test_every_chunk_size(doc):
+    data = doc.encode('utf-8')
+    expected = json.loads(doc)
+    for size in range(1, len(data) + 1):
+        assert list(iter_json_array(chunked(data, size))) == expected, size
+
+
+def test_random_chunk_boundaries():
+    rng = random.Random(0)
+    for _ in range(200):
+        values = [rng.choice([rng.uniform(-1e6, 1e6), rng.randint(-10 ** 12, 10 ** 12), 'x' * rng.randint(0, 5)])
+                  for _ in range(rng.randint(0, 20))]
+        data = json.dumps(values).encode('utf-8')
+        cuts = sorted(rng.sample(range(1, len(data)), min(len(data) - 1, rng.randint(0, 10))))
+        chunks = [data[i:j] for i, j in zip([0] + cuts, cuts + [len(data)])]
+        assert list(iter_json_array(chunks)) == values
+
+
+@pytest.mark.parametrize('doc', ['{"a": 1}', '[1, 2', '[1 2]', '[-1.]'])
+def test_malformed(doc):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(doc.encode('utf-8'), 2)))
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, JobQueue, QueueFullError, StoredJob
+
+
+def wait(job, timeout=5):
+    end = time.monotonic() + timeout
+    while job.finished is None:
+        assert time.monotonic() < end, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queues = []
+
+    def make(run, **options):
+        q = JobQueue(run, storage_root=tmp_path / 'jobs', **options)
+        queues.append(q)
+        return q
+    yield make
+    for q in queues:
+        q.shutdown(wait=True)
+
+
+def test_submit_runs_to_done(queue):
+    def run(job):
+        job.publish('status', 'working')
+        return (job.workdir / 'input.txt').read_text() + ' done'
+
+    q = queue(run)
+    job = q.submit(lambda workdir: (workdir / 'input.txt').write_text('resume'))
+    wait(job)
+    assert (job.status, job.result) == (DONE, 'resume done')
+    assert job.events == [('status', 'working'), ('done', '')]
+
+    # another worker process sees the same job through its directory
+    stored = StoredJob.load(job.id, job.workdir)
+    assert (stored.status, stored.result) == (DONE, 'resume done')
+    assert stored.events == job.events
+
+
+def test_failure_is_reported(queue):
+    def run(job):
+        raise RuntimeError('model unavailable')
+
+    job = wait(queue(run).submit(lambda workdir: None))
+    assert (job.status, job.error) == (FAILED, 'model unavailable')
+    assert job.events[-1] == ('error', 'model unavailable')
+
+
+def test_cancel_queued_and_running(queue):
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(job):
+        started.set()
+        while not job.cancelled:
+            release.wait(0.01)
+        raise RuntimeError('stopped')
+
+    q = queue(run, max_workers=1)
+    running = q.submit(lambda workdir: None)
+    queued = q.submit(lambda workdir: None)
+    assert started.wait(5)
+
+    # the queued job finishes as cancelled at once and never runs
+    callbacks = []
+    queued.on_cancel(lambda: callbacks.append('queued'))
+    q.cancel(queued.id)
+    assert queued.status == CANCELLED and queued.finished is not None
+    assert callbacks == ['queued']
+
+    # a running job stops at its next check
+    q.cancel(running.id)
+    wait(running)
+    assert (running.status, running.error) == (CANCELLED, 'Cancelled.')
+    assert (running.workdir / 'cancel').exists()
+    assert q.cancel(running.id).status == CANCELLED  # already finished: unchanged
+
+
+def test_pending_limit(queue):
+    release = threading.Event()
+    q = queue(lambda job: release.wait(5), max_workers=1, max_pending=2)
+    q.submit(lambda workdir: None)
+    q.submit(lambda workdir: None)
+    saved = []
+    with pytest.raises(QueueFullError):
+        q.submit(saved.append)
+    assert saved == []  # a refused upload is never stored
+    release.set()
+
+
+def test_prune_drops_expired_jobs(queue, tmp_path):
+    q = queue(lambda job: 'ok', ttl=60)
+    old = wait(q.submit(lambda workdir: None))
+    fresh = wait(q.submit(lambda workdir: None))
+    old.finished -= 120
+    # a directory left by another (or a restarted) worker process
+    stale = tmp_path / 'jobs' / ('f' * 32)
+    stale.mkdir()
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+
+    q.prune()
+    assert q.get(old.id) is None and not old.workdir.exists()
+    assert q.get(fresh.id) is fresh and fresh.workdir.exists()
+    assert not stale.exists()
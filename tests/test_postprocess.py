@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from postprocess import LineAnnotator, parse_response, split_machine_json
+
+RESPONSE = """# Resume Analysis
+
+## Recommended Courses
+1. **Data Structures** - core foundation
+2. **Software Methodology** - team practices
+3. **Underwater Basket Weaving** - not in the catalog
+
+---
+
+## Course Roadmap
+### Short term
+- Linear Algebra
+### Long term
+- Deep Learning
+
+## Career Paths
+- Data Structures Engineer
+
+```json
+{"major": "computer", "recommended_courses": ["01:198:112"], "short_term": ["01:640:350"]}
+```
+"""
+
+
+def stream(matcher, text, size):
+    annotator = LineAnnotator(matcher)
+    out = ''.join(annotator.feed(text[i:i + size]) for i in range(0, len(text), size))
+    return out + annotator.close()
+
+
+def test_parse_response_splits_sections_and_data():
+    result = parse_response(RESPONSE)
+    assert result.data == {'major': 'computer', 'recommended_courses': ['01:198:112'], 'short_term': ['01:640:350']}
+    assert [s[0] for s in result.sections] == [
+        'Resume Analysis', 'Recommended Courses', 'Course Roadmap', 'Short term', 'Long term', 'Career Paths']
+    assert '```' not in result.to_markdown()
+    assert result.lines[-1] == '- Data Structures Engineer'
+
+
+def test_annotate_adds_codes_in_course_sections_only(matcher):
+    result = parse_response(RESPONSE).annotate(matcher)
+    lines = result.to_markdown().split('\n')
+    assert '1. **Data Structures** - core foundation (01:198:112)' in lines
+    assert '2. **Software Methodology** - team practices (01:198:213)' in lines
+    assert '3. **Underwater Basket Weaving** - not in the catalog' in lines
+    assert '- Linear Algebra (01:640:350)' in lines
+    assert '- Deep Learning (01:198:462)' in lines
+    # outside the course sections nothing is matched
+    assert '- Data Structures Engineer' in lines
+    assert [c['matched_code'] for c in result.courses] == [
+        '01:198:112', '01:198:213', None, '01:640:350', '01:198:462']
+    assert result.to_dict()['short_term'] == ['01:640:350']
+
+
+def test_annotate_falls_back_to_machine_list(matcher):
+    result = parse_response("## Summary\nNo list here.\n\n```json\n" + json.dumps(
+        {'recommended_courses': ['Data Structures']}) + "\n```").annotate(matcher)
+    assert [c['matched_code'] for c in result.courses] == ['01:198:112']
+
+
+def test_unparseable_json_block_stays_visible():
+    text = "## Notes\n```json\n{not json\n```\nmore\n```json\n{\"major\": \"math\"}\n```\n"
+    markdown, data = split_machine_json(text)
+    assert data == {'major': 'math'}
+    assert markdown == "## Notes\n```json\n{not json\n```\nmore\n"
+
+
+def test_bare_trailing_json():
+    markdown, data = split_machine_json('## Summary\nText\n{"major": "history"}\n')
+    assert data == {'major': 'history'}
+    assert markdown == '## Summary\nText\n'
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 10000])
+def test_streamed_annotation_matches_final(matcher, size):
+    final = parse_response(RESPONSE).annotate(matcher).to_markdown()
+    assert stream(matcher, RESPONSE, size).rstrip('\n') == final
+
+
+@pytest.mark.parametrize('size', [1, 5, 10000])
+def test_streamed_unparseable_block_matches_final(matcher, size):
+    text = "## Recommended Courses\n- Data Structures\n```json\n{oops\n```\n- Linear Algebra\n```json\n{\"major\": \"math\"}\n```\n"
+    final = parse_response(text).annotate(matcher).to_markdown()
+    assert '{oops' in final
+    assert stream(matcher, text, size).rstrip('\n') == final
+
+
+def test_unterminated_block_is_released_on_close(matcher):
+    assert stream(matcher, "intro\n```json\n{\"a\": 1}", 4) == "intro\n```json\n{\"a\": 1}"
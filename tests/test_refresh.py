@@ -0,0 +1,77 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip('requests')
+
+from catalog_tables import expand, is_normalized
+from coursescrapper import make_session, refresh_course_info
+from soc_stub_server import serve
+
+
+def soc_course(code, title, major, instructors=('DOE, JANE',)):
+    """A course as the SOC courses.json API returns it (only the fields the scraper reads)."""
+    return {'courseString': code, 'title': title, 'subjectDescription': major,
+            'sections': [{'instructors': [{'name': n} for n in instructors]}]}
+
+
+@pytest.fixture
+def stub(tmp_path):
+    payloads = tmp_path / 'soc'
+    payloads.mkdir()
+    server = serve(payloads, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield payloads, f"http://127.0.0.1:{server.server_port}/soc/api/courses.json"
+    server.shutdown()
+    server.server_close()
+
+
+def publish(payloads, courses):
+    (payloads / 'courses_2025_9_NB.json').write_text(json.dumps(courses), encoding='utf-8')
+
+
+def refresh(url, filename):
+    return refresh_course_info(make_session(retries=0), 2025, 9, 'NB', filename=str(filename), url=url)
+
+
+def saved(filename):
+    doc = json.loads(filename.read_text(encoding='utf-8'))
+    assert is_normalized(doc)
+    return {c['course_code']: c for c in expand(doc)}
+
+
+def test_refresh_against_stub(stub, tmp_path):
+    payloads, url = stub
+    catalog = tmp_path / 'rutgers_courses_2025_9_NB.json'
+    publish(payloads, [
+        soc_course('01:198:111', 'INTRO COMPUTER SCI', 'Computer Science'),
+        soc_course('01:198:112', 'DATA STRUCTURES', 'Computer Science'),
+        soc_course('01:640:151', 'CALCULUS I', 'Mathematics'),
+    ])
+
+    first = refresh(url, catalog)
+    assert (first['status'], first['added'], first['changed'], first['removed']) == ('updated', 3, 0, 0)
+    assert sorted(saved(catalog)) == ['01:198:111', '01:198:112', '01:640:151']
+    assert json.loads((tmp_path / (catalog.name + '.meta.json')).read_text())['etag']
+
+    # same payload: the stored ETag gets a 304 and the catalog is not rewritten
+    stamp = catalog.stat().st_mtime_ns
+    second = refresh(url, catalog)
+    assert (second['status'], second['added'], second['changed'], second['removed']) == ('not modified', 0, 0, 0)
+    assert catalog.stat().st_mtime_ns == stamp
+
+    # one course kept, one moved to another major, one dropped and one new
+    publish(payloads, [
+        soc_course('01:198:111', 'INTRO COMPUTER SCI', 'Computer Science'),
+        soc_course('01:198:112', 'DATA STRUCTURES', 'Computer Science and Engineering'),
+        soc_course('01:640:250', 'LINEAR ALGEBRA', 'Mathematics'),
+    ])
+    third = refresh(url, catalog)
+    assert (third['status'], third['added'], third['changed'], third['removed']) == ('updated', 1, 1, 1)
+    courses = saved(catalog)
+    assert sorted(courses) == ['01:198:111', '01:198:112', '01:640:250']
+    assert courses['01:198:112']['major'] == 'Computer Science and Engineering'
+
+    assert refresh(url, catalog)['status'] == 'not modified'
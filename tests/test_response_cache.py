@@ -0,0 +1,37 @@
+import sqlite3
+
+from response_cache import ResponseCache, make_key
+
+
+def test_round_trip_and_expiry(tmp_path):
+    cache = ResponseCache(tmp_path / 'responses.sqlite3', ttl=60)
+    key = make_key('major', 'abc')
+    assert cache.get('major', key) is None
+    cache.set('major', key, ['computer', 'raw'])
+    assert cache.get('major', key) == ['computer', 'raw']
+
+    cache.ttl = -1
+    assert cache.get('major', key) is None
+    assert cache.stats()['hits'] == {'major': 1}
+    assert cache.stats()['misses'] == {'major': 2}
+
+
+def test_locked_database_is_a_miss_and_a_skipped_write(tmp_path):
+    path = tmp_path / 'responses.sqlite3'
+    cache = ResponseCache(path)
+    key = make_key('recommendation', 'abc')
+    cache.set('recommendation', key, 'cached')
+    cache._db().execute('PRAGMA busy_timeout = 0')
+
+    # another process holding the write lock
+    other = sqlite3.connect(str(path), isolation_level=None)
+    other.execute('BEGIN EXCLUSIVE')
+    try:
+        cache.set('recommendation', make_key('recommendation', 'def'), 'new')
+        assert cache.get('recommendation', key) is None
+    finally:
+        other.execute('ROLLBACK')
+        other.close()
+    assert cache.stats()['errors'] == 2
+    assert cache.get('recommendation', key) == 'cached'
+    assert cache.get('recommendation', make_key('recommendation', 'def')) is None
@@ -0,0 +1,10 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+The engine (Gemini client, catalog, indexes) is built here at import time. With preload_app
+that happens once in the gunicorn master, and the forked workers share its memory instead of
+each loading the catalog on its first request. The master never serves a catalog, so it does
+not reload them; each worker starts its reload thread in post_fork (gunicorn.conf.py).
+"""
+from app import app, get_engine
+
+get_engine(reload=False)